@@ -1,7 +1,9 @@
 from dotenv import load_dotenv
 import sys
 import os
-from google import genai
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.scheduler import generate_content
 
 API_CONFIG = {
     "model_name": "gemini-1.5-flash",
@@ -14,8 +16,8 @@ def get_ia_response(ask, model_name, temp=API_CONFIG["temperature"]):
         chave_api = os.getenv("GEMINI_API_KEY")
         if not chave_api:
             return "Error: API key not set."
-        client = genai.Client(api_key=chave_api)
-        response = client.models.generate_content(
+        client = get_client(chave_api)
+        response = generate_content(client,
             model=model_name,
             contents=ask,
             config={"temperature": temp}
@@ -1,7 +1,10 @@
 from dotenv import load_dotenv
 import sys
 import os
-from google import genai
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.scheduler import generate_content
+from shared.cache import cached_response, report_cache
 
 API_CONFIG = {
     "model_name": "gemini-1.5-flash",
@@ -29,13 +32,14 @@ def get_ia_response(ask, model_name, temp=API_CONFIG["temperature"]):
         chave_api = os.getenv("GEMINI_API_KEY")
         if not chave_api:
             return "Error: API key not set."
-        client = genai.Client(api_key=chave_api)
-        response = client.models.generate_content(
-            model=model_name,
-            contents=ask,
-            config={"temperature": temp}
-        )
-        return response.text.strip()
+        client = get_client(chave_api)
+        return cached_response(
+            lambda: generate_content(client,
+                model=model_name,
+                contents=ask,
+                config={"temperature": temp}
+            ).text.strip(),
+            model_name, ask, temperature=temp)
     except Exception as e:
         return f"An error occurred: {e}"
 
@@ -61,4 +65,5 @@ if __name__ == "__main__":
     term = " ".join(sys.argv[1:])
     prompt = make_prompt(term)
     response = get_ia_response(prompt, API_CONFIG["model_name"])
-    print(response)
\ No newline at end of file
+    print(response)
+    report_cache()
\ No newline at end of file
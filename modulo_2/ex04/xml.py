@@ -1,7 +1,10 @@
 import os
 from dotenv import load_dotenv
 import sys
-from google import genai
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.scheduler import generate_content
+from shared.cache import cached_response, report_cache
 
 API_CONFIG = {
     "model_name": "gemini-1.5-flash",
@@ -31,13 +34,14 @@ def make_prompt(text, config=API_CONFIG):
 def get_ia_response(ask, model_name, temp=API_CONFIG["temperature"]):
     try:
         chave_api = os.getenv("GEMINI_API_KEY")
-        client = genai.Client(api_key=chave_api)
-        response = client.models.generate_content(
-            model=model_name,
-            contents=ask,
-            config={"temperature": temp}
-        )
-        return response.text.strip()
+        client = get_client(chave_api)
+        return cached_response(
+            lambda: generate_content(client,
+                model=model_name,
+                contents=ask,
+                config={"temperature": temp}
+            ).text.strip(),
+            model_name, ask, temperature=temp)
     except Exception as e:
         return f"Ocorreu um erro: {e}"
 
@@ -50,4 +54,5 @@ if __name__ == "__main__":
     text = " ".join(sys.argv[1:])
     prompt = make_prompt(text)
     response = get_ia_response(prompt, API_CONFIG["model_name"])
-    print(response)
\ No newline at end of file
+    print(response)
+    report_cache()
\ No newline at end of file
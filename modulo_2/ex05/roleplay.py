@@ -1,8 +1,10 @@
 import os
 from dotenv import load_dotenv
 import sys
-from google import genai
 from google.genai import types
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.scheduler import generate_content
 
 API_CONFIG = {
     "model_name": "gemini-1.5-flash",
@@ -30,8 +32,8 @@ def get_ia_response(ask,
                          temp=API_CONFIG["temperature"]):
     try:
         chave_api = os.getenv("GEMINI_API_KEY")
-        client = genai.Client(api_key=chave_api)
-        response = client.models.generate_content(
+        client = get_client(chave_api)
+        response = generate_content(client,
             model=model_name,
             contents=ask,
             config=types.GenerateContentConfig(
@@ -0,0 +1,184 @@
+import os
+import sys
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from structured import Person, submit_ia_response, submit_packed_response
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.cache import report_cache
+
+
+# Extração em lote: registros lidos em fluxo de um JSONL/CSV, chamadas ao modelo
+# entregues ao agendador compartilhado (shared/scheduler.py: concorrência, limites por
+# minuto e novas tentativas em 429), validação com Person num pool de processos e
+# resultados gravados linha a linha num JSONL, que também serve de checkpoint.
+BATCH_CONFIG = {
+    "max_in_flight": 16,      # pedidos entre a chamada ao modelo e a gravação
+    "validate_workers": 2,    # processos validando respostas
+    "text_field": "text",     # coluna/campo com o texto livre
+    "id_field": "id",         # coluna/campo identificador (padrão: número da linha)
+    "report_every": 100,      # registros entre relatórios de progresso
+    # modo empacotado: vários textos por pedido, tamanho do pacote ajustado sozinho
+    "pack_start": 4,
+    "pack_min": 1,
+    "pack_max": 32,
+    "pack_max_response_chars": 16000,  # respostas maiores que isso encolhem o pacote
+    "pack_max_error_rate": 0.1,        # acima disso o pacote é reduzido à metade
+}
+
+
+def read_records(path, text_field=BATCH_CONFIG["text_field"], id_field=BATCH_CONFIG["id_field"]):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows):
+            yield str(row.get(id_field, number)), row[text_field]
+
+
+def load_done_ids(output_path):
+    # checkpoint: registros já extraídos com sucesso não são pedidos de novo
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # última linha cortada por uma interrupção
+                if "person" in result:
+                    done.add(result["id"])
+    return done
+
+
+def validate_response(record_id, response):
+    try:
+        person = Person.model_validate(json.loads(response))
+        return {"id": record_id, "person": person.model_dump()}
+    except Exception as e:
+        return {"id": record_id, "error": str(e), "response": response}
+
+
+def validate_pack(record_ids, response):
+    # separa a lista devolvida pelo modelo de volta em um resultado por registro
+    try:
+        items = json.loads(response)
+        by_index = {item.get("indice"): item for item in items if isinstance(item, dict)}
+    except Exception as e:
+        return [{"id": record_id, "error": str(e), "response": response} for record_id in record_ids]
+    results = []
+    for i, record_id in enumerate(record_ids):
+        if i not in by_index:
+            results.append({"id": record_id, "error": f"índice {i} ausente na resposta do pacote"})
+            continue
+        data = {k: v for k, v in by_index[i].items() if k != "indice"}
+        results.append(validate_response(record_id, json.dumps(data, ensure_ascii=False)))
+    return results
+
+
+class PackSizer:
+    # Ajuste do tamanho do pacote: cresce de um em um enquanto as respostas vêm
+    # completas e pequenas; cai pela metade quando há erros ou a resposta fica grande.
+    def __init__(self, config=BATCH_CONFIG):
+        self.config = config
+        self.size = config["pack_start"]
+
+    def update(self, pack_size, errors, response_chars):
+        if errors / pack_size > self.config["pack_max_error_rate"] \
+                or response_chars > self.config["pack_max_response_chars"]:
+            self.size = max(self.config["pack_min"], self.size // 2)
+        elif pack_size >= self.size and response_chars < self.config["pack_max_response_chars"] / 2:
+            self.size = min(self.config["pack_max"], self.size + 1)
+
+
+def read_packs(records, done, stats, sizer=None):
+    # agrupa os registros pendentes em pacotes; sem sizer, um registro por pedido
+    ids, texts = [], []
+    for record_id, text in records:
+        if record_id in done:
+            stats["skipped"] += 1
+            continue
+        ids.append(record_id)
+        texts.append(text)
+        if len(ids) >= (sizer.size if sizer else 1):
+            yield ids, texts
+            ids, texts = [], []
+    if ids:
+        yield ids, texts
+
+
+def extract_batch(input_path, output_path, max_in_flight=BATCH_CONFIG["max_in_flight"],
+                  validate_workers=BATCH_CONFIG["validate_workers"], report_every=BATCH_CONFIG["report_every"],
+                  packed=False):
+    done = load_done_ids(output_path)
+    stats = {"ok": 0, "error": 0, "skipped": 0, "requests": 0}
+    sizer = PackSizer() if packed else None
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(validate_workers) as validate_pool, \
+            open(output_path, "a", encoding="utf-8") as out:
+        in_flight = {}  # future -> (ids dos registros, tamanho da resposta); extrações e validações
+
+        def collect(futures):
+            for future in futures:
+                record_ids, response_chars = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # esgotou as novas tentativas ou o prazo: vira erro do registro,
+                    # que será pedido de novo na próxima execução
+                    result = f"Ocorreu um erro: {e}"
+                if isinstance(result, str):
+                    # extração terminou: a validação roda fora das threads de rede
+                    if packed:
+                        task = validate_pool.submit(validate_pack, record_ids, result)
+                    else:
+                        task = validate_pool.submit(validate_response, record_ids[0], result)
+                    in_flight[task] = (record_ids, len(result))
+                    continue
+                results = result if isinstance(result, list) else [result]
+                errors = sum("person" not in r for r in results)
+                if sizer:
+                    sizer.update(len(record_ids), errors, response_chars)
+                for r in results:
+                    out.write(json.dumps(r, ensure_ascii=False) + "\n")
+                out.flush()
+                before = stats["ok"] + stats["error"]
+                stats["ok"] += len(results) - errors
+                stats["error"] += errors
+                total = stats["ok"] + stats["error"]
+                if total // report_every > before // report_every:
+                    rate = total / max(time.perf_counter() - start, 1e-9)
+                    print(f"{total} registros ({stats['error']} com erro), {rate:.1f} registros/s"
+                          + (f", pacote de {sizer.size}" if sizer else ""), flush=True)
+
+        for record_ids, texts in read_packs(read_records(input_path), done, stats, sizer):
+            if packed:
+                task = submit_packed_response(texts)
+            else:
+                task = submit_ia_response(texts[0])
+            in_flight[task] = (record_ids, 0)
+            stats["requests"] += 1
+            while len(in_flight) >= max_in_flight:
+                collect(wait(list(in_flight), return_when=FIRST_COMPLETED).done)
+        while in_flight:
+            collect(wait(list(in_flight), return_when=FIRST_COMPLETED).done)
+
+    elapsed = time.perf_counter() - start
+    total = stats["ok"] + stats["error"]
+    print(f"Concluído: {stats['ok']} extraídos, {stats['error']} com erro, {stats['skipped']} já feitos "
+          f"em {stats['requests']} pedidos e {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} registros/s)")
+    return stats
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    args = [a for a in sys.argv[1:] if a != "--packed"]
+    if len(args) < 2:
+        print("Usage: python batch_extract.py <entrada.jsonl|entrada.csv> <saida.jsonl> [--packed]")
+        sys.exit(1)
+    extract_batch(args[0], args[1], packed="--packed" in sys.argv)
+    report_cache()
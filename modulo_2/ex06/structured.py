@@ -2,9 +2,12 @@ import json
 import os
 from dotenv import load_dotenv
 import sys
-from google import genai
 from google.genai import types
 from pydantic import BaseModel
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.cache import cached_future, report_cache
+from shared.scheduler import submit_text
 
 API_CONFIG = {
     "model_name": "gemini-1.5-flash",
@@ -21,21 +24,63 @@ class Person(BaseModel):
     profissão: str
     cidade: str
 
+class PackedPerson(Person):
+    indice: int  # posição do texto de origem dentro do pacote
+
+def submit_ia_response(ask,
+                       model_name=API_CONFIG["model_name"],
+                       temp=API_CONFIG["temperature"]):
+    # não bloqueia: devolve um Future com o texto (usado pelo modo em lote)
+    chave_api = os.getenv("GEMINI_API_KEY")
+    client = get_client(chave_api)
+    return cached_future(
+        lambda: submit_text(client,
+            model=model_name,
+            contents=ask,
+            config=types.GenerateContentConfig(
+            system_instruction=API_CONFIG["instructions"],
+            temperature=temp, response_mime_type="application/json",
+            response_schema=Person)
+        ),
+        model_name, ask, API_CONFIG["instructions"], temp, Person)
+
 def get_ia_response(ask,
                          model_name=API_CONFIG["model_name"],
                          temp=API_CONFIG["temperature"]):
     try:
-        chave_api = os.getenv("GEMINI_API_KEY")
-        client = genai.Client(api_key=chave_api)
-        response = client.models.generate_content(
+        return submit_ia_response(ask, model_name, temp).result()
+    except Exception as e:
+        return f"Ocorreu um erro: {e}"
+
+
+def make_packed_prompt(texts):
+    # vários textos num único pedido, cada um marcado com seu índice
+    records = "\n".join(f'<registro indice="{i}">\n{text}\n</registro>' for i, text in enumerate(texts))
+    return ("Extraia uma pessoa de cada registro abaixo. Retorne uma lista com um item por registro, "
+            "informando em 'indice' o índice do registro de origem.\n" + records)
+
+def submit_packed_response(texts,
+                           model_name=API_CONFIG["model_name"],
+                           temp=API_CONFIG["temperature"]):
+    ask = make_packed_prompt(texts)
+    chave_api = os.getenv("GEMINI_API_KEY")
+    client = get_client(chave_api)
+    return cached_future(
+        lambda: submit_text(client,
             model=model_name,
             contents=ask,
             config=types.GenerateContentConfig(
             system_instruction=API_CONFIG["instructions"],
             temperature=temp, response_mime_type="application/json",
-            response_schema=Person)
-        )
-        return response.text.strip()
+            response_schema=list[PackedPerson])
+        ),
+        model_name, ask, API_CONFIG["instructions"], temp, list[PackedPerson])
+
+def get_packed_response(texts,
+                        model_name=API_CONFIG["model_name"],
+                        temp=API_CONFIG["temperature"]):
+    try:
+        return submit_packed_response(texts, model_name, temp).result()
     except Exception as e:
         return f"Ocorreu um erro: {e}"
 
@@ -51,11 +96,18 @@ if __name__ == "__main__":
     load_dotenv()
     if len(sys.argv) < 2:
         print("Usage: python structured.py <Fatos sobre uma pessoa>")
+        print("       python structured.py --batch <entrada.jsonl|entrada.csv> <saida.jsonl> [--packed]")
         sys.exit(1)
+    if sys.argv[1] == "--batch" and len(sys.argv) > 3:
+        from batch_extract import extract_batch
+        extract_batch(sys.argv[2], sys.argv[3], packed="--packed" in sys.argv)
+        report_cache()
+        sys.exit(0)
     ask = " ".join(sys.argv[1:])
     response = get_ia_response(ask)
 
     print(response)
+    report_cache()
 
     # data = json.loads(response)
     # print(json.dumps(data, indent=4, ensure_ascii=False))
@@ -1,8 +1,12 @@
 import os
 from dotenv import load_dotenv
 import sys
-from google import genai
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
 from google.genai import types
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.scheduler import submit_text, configure, SCHEDULER_CONFIG
 
 API_CONFIG = {
     "model_name": "gemini-1.5-flash",
@@ -13,21 +17,40 @@ API_CONFIG = {
     "instruction_3": """Traduza o anúncio publicitário recebido para o inglês."""
 }
 
+# Catálogo: vários produtos passam pela cadeia ao mesmo tempo. Enquanto um produto
+# está na tradução, outro já pode estar na descrição. Limites por minuto e novas
+# tentativas em 429 ficam com o agendador compartilhado (shared/scheduler.py).
+CHAIN_CONFIG = {
+    "concurrency": 4,            # produtos em andamento ao mesmo tempo
+    "requests_per_minute": None, # limite de chamadas durante o catálogo (None = o do agendador, 0 = sem limite)
+}
+
+STAGES = [
+    ("instruction_1", "Descrição detalhada do produto"),
+    ("instruction_2", "Anúncio publicitário"),
+    ("instruction_3", "Tradução para o inglês"),
+]
+
+def submit_ia_response(ask, instruction=API_CONFIG["instruction"],
+                            model_name=API_CONFIG["model_name"],
+                            temp=API_CONFIG["temperature"]):
+    # não bloqueia: devolve um Future com o texto da resposta
+    chave_api = os.getenv("GEMINI_API_KEY")
+    client = get_client(chave_api)
+    return submit_text(client,
+        model=model_name,
+        contents=ask,
+        config=types.GenerateContentConfig(
+        system_instruction=instruction,
+        temperature=temp, max_output_tokens=1024
+        )
+    )
+
 def get_ia_response(ask, instruction=API_CONFIG["instruction"],
                          model_name=API_CONFIG["model_name"],
                          temp=API_CONFIG["temperature"]):
     try:
-        chave_api = os.getenv("GEMINI_API_KEY")
-        client = genai.Client(api_key=chave_api)
-        response = client.models.generate_content(
-            model=model_name,
-            contents=ask,
-            config=types.GenerateContentConfig(
-            system_instruction=instruction,
-            temperature=temp, max_output_tokens=1024
-            )
-        )
-        return response.text.strip()
+        return submit_ia_response(ask, instruction, model_name, temp).result()
     except Exception as e:
         return f"Ocorreu um erro: {e}"
 
@@ -58,10 +81,70 @@ def set_data_instructions(ask):
     print_response(response3, "Tradução para o inglês")
  
 
+def run_catalogue(products, concurrency=CHAIN_CONFIG["concurrency"],
+                  requests_per_minute=CHAIN_CONFIG["requests_per_minute"]):
+    # devolve (produto, respostas) na ordem em que cada cadeia termina.
+    # Cada etapa é um pedido ao agendador; aqui só se encadeia a próxima etapa
+    # quando a anterior chega, com até `concurrency` produtos em andamento.
+    # Um requests_per_minute próprio vale só enquanto o catálogo roda: o valor
+    # anterior do agendador (usado pelo resto do processo) volta no final.
+    previous = SCHEDULER_CONFIG["requests_per_minute"]
+    if requests_per_minute is not None:
+        configure(requests_per_minute=requests_per_minute)
+    try:
+        yield from chain_catalogue(products, concurrency)
+    finally:
+        if requests_per_minute is not None:
+            configure(requests_per_minute=previous)
+
+def chain_catalogue(products, concurrency):
+    queue = iter(products)
+    in_flight = {}  # future -> (produto, respostas até agora)
+
+    def start(product, responses, ask):
+        instruction = API_CONFIG[STAGES[len(responses)][0]]
+        in_flight[submit_ia_response(ask, instruction)] = (product, responses)
+
+    for product in queue:
+        start(product, [], product)
+        if len(in_flight) >= concurrency:
+            break
+    while in_flight:
+        for future in wait(list(in_flight), return_when=FIRST_COMPLETED).done:
+            product, responses = in_flight.pop(future)
+            try:
+                response = future.result()
+            except Exception as e:
+                response = f"Ocorreu um erro: {e}"
+            responses.append(response)
+            if len(responses) < len(STAGES) and response and not response.startswith("Ocorreu um erro"):
+                start(product, responses, response)
+                continue
+            yield product, responses
+            next_product = next(queue, None)
+            if next_product is not None:
+                start(next_product, [], next_product)
+
+def print_catalogue(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        products = [line.strip() for line in f if line.strip()]
+    start = time.perf_counter()
+    for product, responses in run_catalogue(products):
+        print(f"\n===== {product} =====")
+        for response, (_, title) in zip(responses, STAGES):
+            print_response(response, title)
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(products)} produtos em {elapsed:.1f}s ({len(products) / max(elapsed, 1e-9):.2f} produtos/s)")
+
+
 if __name__ == "__main__":
     load_dotenv()
     if len(sys.argv) < 2:
         print("Usage: python chaining.py <Um produto>")
+        print("       python chaining.py --catalogo <arquivo com um produto por linha>")
         sys.exit(1)
+    if sys.argv[1] == "--catalogo" and len(sys.argv) > 2:
+        print_catalogue(sys.argv[2])
+        sys.exit(0)
     ask = " ".join(sys.argv[1:])
-    set_data_instructions(ask)
\ No newline at end of file
+    set_data_instructions(ask)
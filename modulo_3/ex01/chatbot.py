@@ -1,13 +1,19 @@
 import os
 import sys
+from collections import deque
 from dotenv import load_dotenv
-from google import genai
 from google.genai import types
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.scheduler import generate_content, stream_content
+from shared.context import build_context
 
 API_CONFIG = {
     "model_name": "gemini-1.5-flash",
     "temperature": 1.0,
     "instruction": "Seja como um amigo simpático e extrovertido. Mas não revele que é uma IA. Use emojis nas respostas. Evite respostas muito longas.",
+    "stream": True,
+    "history_size": 5,
 }
 
 def get_ia_response(ask,
@@ -16,8 +22,8 @@ def get_ia_response(ask,
                     temp=API_CONFIG["temperature"]):
     try:
         api_key = os.getenv("GEMINI_API_KEY")
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
+        client = get_client(api_key)
+        response = generate_content(client,
             model=model_name,
             contents=ask,
             config=types.GenerateContentConfig(
@@ -29,10 +35,45 @@ def get_ia_response(ask,
     except Exception as e:
         return f"[Erro ao gerar resposta: {e}]"
 
+def stream_ia_response(ask,
+                       instruction=API_CONFIG["instruction"],
+                       model_name=API_CONFIG["model_name"],
+                       temp=API_CONFIG["temperature"]):
+    # devolve a resposta em pedaços, conforme o modelo vai gerando;
+    # erros (inclusive no meio do stream) sobem para quem consome, ver print_streamed
+    api_key = os.getenv("GEMINI_API_KEY")
+    client = get_client(api_key)
+    for chunk in stream_content(client,
+        model=model_name,
+        contents=ask,
+        config=types.GenerateContentConfig(
+            system_instruction=instruction,
+            temperature=temp, max_output_tokens=1024
+        )
+    ):
+        if chunk.text:
+            yield chunk.text
+
+def print_streamed(chunks, prefix="Bob: "):
+    # imprime cada pedaço assim que chega e devolve a resposta completa.
+    # Se o stream falhar (mesmo no meio), avisa e devolve None: resposta parcial não é gravada
+    print(prefix, end="", flush=True)
+    parts = []
+    try:
+        for chunk in chunks:
+            print(chunk, end="", flush=True)
+            parts.append(chunk)
+    except Exception as e:
+        print(f"\n[Erro ao gerar resposta: {e}]", flush=True)
+        return None
+    print()
+    return "".join(parts).strip()
+
 
 def main():
 
-	history = []
+	# só os últimos turnos crus (pergunta, resposta); o deque descarta o mais antigo sozinho
+	history = deque(maxlen=API_CONFIG["history_size"])
 	print("Chatbot Gemini (digite 'bye' para encerrar)")
 	response = get_ia_response("Apresente-se como meu amigo, Bob", API_CONFIG["instruction"])
 	print(f"Bob: {response}")
@@ -41,19 +82,16 @@ def main():
 		user_input = input("Q: ")
 		if user_input.strip().lower() == "bye":
 			break
-		context = ""
-		for u, b in history[-5:]:
-			context += f"User: {u}\nBot: {b}\n"
-		context += f"User: {user_input}\nBot: "
-		user_input = context
-		print("Bob is typing...")
-		bot_reply = get_ia_response(user_input, API_CONFIG["instruction"])
-
-		print(f"Bob: {bot_reply}")
-		history.append((user_input, bot_reply))
-		
-		if len(history) > 5:
-			history = history[-5:]
+		context, _ = build_context(user_input.strip(), history)
+		if API_CONFIG["stream"]:
+			bot_reply = print_streamed(stream_ia_response(context, API_CONFIG["instruction"]))
+			if bot_reply is None:
+				continue  # falhou no meio: o turno não entra no histórico
+		else:
+			print("Bob is typing...")
+			bot_reply = get_ia_response(context, API_CONFIG["instruction"])
+			print(f"Bob: {bot_reply}")
+		history.append((user_input.strip(), bot_reply))
 
 
 if __name__ == "__main__":
@@ -1,9 +1,22 @@
 import os
 import sys
+import time
 import sqlite3
+import threading
+import queue
+import importlib.util
+import numpy as np
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from google import genai
 from google.genai import types
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.scheduler import generate_content, stream_content
+from shared.context import build_context
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ex04"))
+from encoder import get_model
+from store import normalize_rows
+from index import top_k_indices
 
 DB_FILE = "chatbot.db"
 
@@ -11,7 +24,14 @@ API_CONFIG = {
     "model_name": "gemini-1.5-flash",
     "temperature": 1.0,
     "instruction": "Seja como um amigo simpático e extrovertido. Mas não revele que é uma IA. Use emojis nas respostas. Evite respostas muito longas.",
-    "instruction_summary": "Resuma de forma breve e objetiva as interações a seguir para memória de longo prazo. Foque nos temas principais, decisões tomadas e sentimentos expressos."
+    "instruction_summary": "Resuma de forma breve e objetiva as interações a seguir para memória de longo prazo. Foque nos temas principais, decisões tomadas e sentimentos expressos.",
+    "stream": True,
+}
+
+MEMORY_CONFIG = {
+    "enabled": True,   # desligada automaticamente se sentence-transformers não estiver instalado
+    "top_k": 3,        # memórias antigas relevantes por turno
+    "window": 5,       # turnos recentes que já vão inteiros no prompt
 }
 
 def get_ia_response(ask,
@@ -20,8 +40,8 @@ def get_ia_response(ask,
                     temp=API_CONFIG["temperature"]):
     try:
         api_key = os.getenv("GEMINI_API_KEY")
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
+        client = get_client(api_key)
+        response = generate_content(client,
             model=model_name,
             contents=ask,
             config=types.GenerateContentConfig(
@@ -33,100 +53,374 @@ def get_ia_response(ask,
     except Exception as e:
         return f"[Erro ao gerar resposta: {e}]"
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user TEXT,
-                    bot TEXT
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS summaries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    summary TEXT
-                )''')
-    conn.commit()
-    conn.close()
-
-def save_message(user, bot):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO messages (user, bot) VALUES (?, ?)", (user, bot))
-    conn.commit()
-    conn.close()
-
-def get_last_messages(n=5):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT user, bot FROM messages ORDER BY id DESC LIMIT ?", (n,))
-    rows = c.fetchall()
-    conn.close()
-    return rows[::-1]  # reverse to chronological order
-
-def get_user_turns():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT user, bot FROM messages WHERE TRIM(user) != ''")
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def save_summary(summary):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO summaries (summary) VALUES (?)", (summary,))
-    conn.commit()
-    conn.close()
-
-def get_last_summaries(n=10):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT summary FROM summaries ORDER BY id DESC LIMIT ?", (n,))
-    rows = c.fetchall()
-    conn.close()
-    return [r[0] for r in rows[::-1]]
+def stream_ia_response(ask,
+                       instruction=API_CONFIG["instruction"],
+                       model_name=API_CONFIG["model_name"],
+                       temp=API_CONFIG["temperature"]):
+    # devolve a resposta em pedaços, conforme o modelo vai gerando;
+    # erros (inclusive no meio do stream) sobem para quem consome, ver print_streamed
+    api_key = os.getenv("GEMINI_API_KEY")
+    client = get_client(api_key)
+    for chunk in stream_content(client,
+        model=model_name,
+        contents=ask,
+        config=types.GenerateContentConfig(
+            system_instruction=instruction,
+            temperature=temp, max_output_tokens=1024
+        )
+    ):
+        if chunk.text:
+            yield chunk.text
+
+def print_streamed(chunks, prefix="Bob: "):
+    # imprime cada pedaço assim que chega e devolve a resposta completa.
+    # Se o stream falhar (mesmo no meio), avisa e devolve None: resposta parcial não é gravada
+    print(prefix, end="", flush=True)
+    parts = []
+    try:
+        for chunk in chunks:
+            print(chunk, end="", flush=True)
+            parts.append(chunk)
+    except Exception as e:
+        print(f"\n[Erro ao gerar resposta: {e}]", flush=True)
+        return None
+    print()
+    return "".join(parts).strip()
+
+class ChatStore:
+    # Uma única conexão para o processo inteiro, em modo WAL: leituras não bloqueiam
+    # a escrita e cada turno grava tudo numa só transação (um único fsync).
+    # Cada conversa é uma sessão (session_id); um mesmo banco guarda várias.
+    def __init__(self, db_file=DB_FILE):
+        self.conn = sqlite3.connect(db_file, isolation_level=None, cached_statements=64,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.RLock()
+        self.init_db()
+
+    def init_db(self):
+        with self.transaction():
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS messages (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            session_id TEXT NOT NULL DEFAULT 'default',
+                            user_id TEXT,
+                            user TEXT,
+                            bot TEXT,
+                            created_at REAL
+                        )''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS summaries (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            session_id TEXT NOT NULL DEFAULT 'default',
+                            user_id TEXT,
+                            summary TEXT,
+                            created_at REAL
+                        )''')
+            self.migrate()
+            new_sessions = not self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'").fetchone()
+            # uma linha por sessão, com o contador de turnos do usuário mantido por triggers
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                            session_id TEXT PRIMARY KEY,
+                            user_id TEXT,
+                            user_turns INTEGER NOT NULL DEFAULT 0,
+                            created_at REAL,
+                            updated_at REAL
+                        )''')
+            if new_sessions:
+                self.conn.execute("""INSERT INTO sessions (session_id, user_id, user_turns, created_at, updated_at)
+                            SELECT session_id, MAX(user_id), SUM(TRIM(user) != ''), MIN(created_at), MAX(created_at)
+                            FROM messages GROUP BY session_id""")
+            self.conn.execute('''CREATE TRIGGER IF NOT EXISTS count_session_turns_insert
+                            AFTER INSERT ON messages WHEN TRIM(NEW.user) != ''
+                            BEGIN
+                                UPDATE sessions SET user_turns = user_turns + 1, updated_at = NEW.created_at
+                                WHERE session_id = NEW.session_id;
+                            END''')
+            self.conn.execute('''CREATE TRIGGER IF NOT EXISTS count_session_turns_delete
+                            AFTER DELETE ON messages WHEN TRIM(OLD.user) != ''
+                            BEGIN
+                                UPDATE sessions SET user_turns = user_turns - 1
+                                WHERE session_id = OLD.session_id;
+                            END''')
+            # índices (session_id, id): as leituras do fim de uma conversa não varrem as outras
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+            self.conn.execute("""CREATE INDEX IF NOT EXISTS idx_messages_session_user_turns
+                            ON messages (session_id, id) WHERE TRIM(user) != ''""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_session ON summaries (session_id, id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)")
+            # memória semântica: texto + vetor float32 normalizado de turnos antigos e resumos
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS memories (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            session_id TEXT NOT NULL,
+                            kind TEXT NOT NULL,
+                            source_id INTEGER NOT NULL,
+                            text TEXT,
+                            embedding BLOB,
+                            created_at REAL,
+                            UNIQUE (kind, source_id)
+                        )''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_session ON memories (session_id, id)")
+
+    def migrate(self):
+        # bancos anteriores às sessões: as mensagens existentes ficam na sessão 'default'
+        for table in ("messages", "summaries"):
+            columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if "session_id" not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN session_id TEXT NOT NULL DEFAULT 'default'")
+            if "user_id" not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN user_id TEXT")
+            if "created_at" not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN created_at REAL")
+        # contador global da versão de sessão única, substituído pela tabela sessions
+        self.conn.execute("DROP TRIGGER IF EXISTS count_user_turns_insert")
+        self.conn.execute("DROP TRIGGER IF EXISTS count_user_turns_delete")
+        self.conn.execute("DROP INDEX IF EXISTS idx_messages_user_turns")
+        self.conn.execute("DROP TABLE IF EXISTS metadata")
+
+    @contextmanager
+    def transaction(self):
+        # transações aninhadas são absorvidas pela mais externa
+        with self.lock:
+            if self.conn.in_transaction:
+                yield self.conn
+                return
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def save_message(self, session_id, user, bot, user_id=None):
+        now = time.time()
+        with self.transaction():
+            self.conn.execute("INSERT OR IGNORE INTO sessions (session_id, user_id, created_at, updated_at) "
+                              "VALUES (?, ?, ?, ?)", (session_id, user_id, now, now))
+            self.conn.execute("INSERT INTO messages (session_id, user_id, user, bot, created_at) "
+                              "VALUES (?, ?, ?, ?, ?)", (session_id, user_id, user, bot, now))
+
+    def get_last_messages(self, session_id, n=5):
+        rows = self.query("SELECT user, bot FROM messages WHERE session_id = ? "
+                          "ORDER BY id DESC LIMIT ?", (session_id, n))
+        return rows[::-1]  # reverse to chronological order
+
+    def count_user_turns(self, session_id):
+        row = self.query("SELECT user_turns FROM sessions WHERE session_id = ?", (session_id,))
+        return row[0][0] if row else 0
+
+    def get_user_turns(self, session_id, n=10):
+        rows = self.query("SELECT user, bot FROM messages WHERE session_id = ? AND TRIM(user) != '' "
+                          "ORDER BY id DESC LIMIT ?", (session_id, n))
+        return rows[::-1]
+
+    def save_summary(self, session_id, summary, user_id=None):
+        with self.transaction():
+            cursor = self.conn.execute("INSERT INTO summaries (session_id, user_id, summary, created_at) "
+                                       "VALUES (?, ?, ?, ?)", (session_id, user_id, summary, time.time()))
+            return cursor.lastrowid
+
+    def get_last_summaries(self, session_id, n=10):
+        rows = self.query("SELECT summary FROM summaries WHERE session_id = ? "
+                          "ORDER BY id DESC LIMIT ?", (session_id, n))
+        return [r[0] for r in rows[::-1]]
+
+    def prune_summaries(self, session_id, keep=10):
+        with self.transaction():
+            self.conn.execute("DELETE FROM summaries WHERE session_id = ? AND id NOT IN "
+                              "(SELECT id FROM summaries WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                              (session_id, session_id, keep))
+
+    def get_message_at(self, session_id, offset):
+        # mensagem na posição `offset` a partir da mais nova (0 = a última)
+        rows = self.query("SELECT id, user, bot FROM messages WHERE session_id = ? "
+                          "ORDER BY id DESC LIMIT 1 OFFSET ?", (session_id, offset))
+        return rows[0] if rows else None
+
+    def get_unindexed_messages(self, session_id, window=5):
+        return self.query("SELECT id, user, bot FROM messages m WHERE session_id = ? AND id NOT IN "
+                          "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?) "
+                          "AND NOT EXISTS (SELECT 1 FROM memories WHERE kind = 'message' AND source_id = m.id) "
+                          "ORDER BY id", (session_id, session_id, window))
+
+    def save_memory(self, session_id, kind, source_id, text, embedding):
+        with self.transaction():
+            cursor = self.conn.execute("INSERT OR IGNORE INTO memories "
+                                       "(session_id, kind, source_id, text, embedding, created_at) "
+                                       "VALUES (?, ?, ?, ?, ?, ?)",
+                                       (session_id, kind, source_id, text, embedding, time.time()))
+            return cursor.rowcount > 0
+
+    def get_memories(self, session_id):
+        return self.query("SELECT text, embedding FROM memories WHERE session_id = ? ORDER BY id", (session_id,))
+
+    def close(self):
+        self.conn.close()
 
 def summarize(history, instruction):
     context = "\n".join([f"User: {u}\nBot: {b}" for u, b in history[-10:]])
     resumo = get_ia_response(context, instruction)
     return resumo
 
+class BackgroundWorker:
+    # Executa tarefas lentas (resumos, embeddings da memória) numa thread em segundo
+    # plano: o turno do usuário não espera por elas. O próximo turno usa o que já terminou.
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args):
+        self.jobs.put((fn, args))
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                fn, args = job
+                fn(*args)
+            except Exception as e:
+                print(f"[Erro em tarefa de segundo plano: {e}]")
+            finally:
+                self.jobs.task_done()
+
+    def stop(self):
+        # espera as tarefas pendentes antes de fechar o banco
+        self.jobs.put(None)
+        self.thread.join()
+
+class MemoryIndex:
+    # Memória de longo prazo semântica: turnos que saem da janela curta e resumos são
+    # codificados com o MiniLM do RAG (modulo_3/ex04) e gravados na tabela memories do
+    # próprio chatbot.db. A cada turno entram no prompt só as top_k mais parecidas.
+    def __init__(self, store):
+        self.store = store
+        # session_id -> {"texts", "matrix", "size"}: a matriz tem folga e cresce dobrando,
+        # só as primeiras `size` linhas valem
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def encode(self, texts):
+        return normalize_rows(get_model().encode(texts))
+
+    def load(self, session_id):
+        with self.lock:
+            entry = self.cache.get(session_id)
+            if entry is None:
+                rows = self.store.get_memories(session_id)
+                texts = [text for text, _ in rows]
+                matrix = np.array([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows else None
+                entry = self.cache[session_id] = {"texts": texts, "matrix": matrix, "size": len(texts)}
+            matrix = entry["matrix"]
+            return entry["texts"], None if matrix is None else matrix[:entry["size"]]
+
+    @staticmethod
+    def append(entry, text, vector):
+        # sem np.vstack a cada memória: quando a folga acaba, a matriz é copiada para
+        # uma com o dobro de linhas (custo amortizado constante por turno)
+        matrix, size = entry["matrix"], entry["size"]
+        if matrix is None or size == len(matrix):
+            grown = np.empty((max(8, 2 * size), len(vector)), dtype=np.float32)
+            if size:
+                grown[:size] = matrix[:size]
+            entry["matrix"] = matrix = grown
+        matrix[size] = vector
+        entry["texts"].append(text)
+        entry["size"] = size + 1
+
+    def add(self, session_id, kind, source_id, text):
+        vector = self.encode([text])[0]
+        # gravação e cache sob o mesmo lock: um load() concorrente lê o banco antes
+        # ou depois do par inteiro, nunca entre os dois (o que duplicaria a memória)
+        with self.lock:
+            if not self.store.save_memory(session_id, kind, source_id, text, vector.tobytes()):
+                return  # já indexada
+            if session_id in self.cache:
+                self.append(self.cache[session_id], text, vector)
+
+    def add_turn(self, session_id, message_id, user, bot):
+        self.add(session_id, "message", message_id, f"User: {user}\nBot: {bot}")
+
+    def backfill(self, session_id, window=MEMORY_CONFIG["window"]):
+        # indexa o histórico antigo de bancos criados antes da memória semântica
+        for message_id, user, bot in self.store.get_unindexed_messages(session_id, window):
+            self.add_turn(session_id, message_id, user, bot)
+
+    def search(self, session_id, query, top_k=MEMORY_CONFIG["top_k"]):
+        texts, matrix = self.load(session_id)
+        if matrix is None:
+            return []
+        scores = matrix @ self.encode([query])[0]
+        best = top_k_indices(scores, top_k)
+        return [texts[i] for i in sorted(best)]  # em ordem cronológica
+
+def summarize_job(store, session_id, history, user_id=None, memory=None,
+                  instruction=API_CONFIG["instruction_summary"], keep=10):
+    summary = summarize(history, instruction)
+    with store.transaction():
+        summary_id = store.save_summary(session_id, summary, user_id)
+        store.prune_summaries(session_id, keep)
+    if memory:
+        memory.add(session_id, "summary", summary_id, summary)
+
+def memory_available():
+    return MEMORY_CONFIG["enabled"] and importlib.util.find_spec("sentence_transformers") is not None
+
 def main():
     load_dotenv()
-    init_db()
+    session_id = sys.argv[1] if len(sys.argv) > 1 else "default"
+    user_id = sys.argv[2] if len(sys.argv) > 2 else None
+    store = ChatStore()
+    worker = BackgroundWorker()
+    memory = MemoryIndex(store) if memory_available() else None
+    window = MEMORY_CONFIG["window"]
+    if memory:
+        worker.submit(memory.backfill, session_id, window)
     print("Chatbot Gemini (digite 'bye' para encerrar)")
-    if not get_user_turns():
+    if not store.count_user_turns(session_id):
         response = get_ia_response("Apresente-se como meu amigo, Bob", API_CONFIG["instruction"])
         print(f"Bob: {response}")
-        save_message("", response)
+        store.save_message(session_id, "", response, user_id)
 
     while True:
         user_input = input("Q: ")
         if user_input.strip().lower() == "bye":
             break
-        short_memory = get_last_messages(5)
-        context = ""
-        for u, b in short_memory:
-            context += f"User: {u}\nBot: {b}\n"
-        context += f"User: {user_input}\nBot: "
-        long_memory = get_last_summaries(10)
-        if long_memory:
-            context = "\n".join([f"Resumo: {s}" for s in long_memory]) + "\n" + context
-        print("Bob is typing...")
-        bot_reply = get_ia_response(context, API_CONFIG["instruction"])
-        print(f"Bob: {bot_reply}")
-        save_message(user_input, bot_reply)
-        user_turns = get_user_turns()
-        if len(user_turns) % 10 == 0 and user_turns:
-            summary = summarize(user_turns, API_CONFIG["instruction_summary"])
-            save_summary(summary)
-
-            if len(get_last_summaries(11)) > 10:
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute("DELETE FROM summaries WHERE id NOT IN (SELECT id FROM summaries ORDER BY id DESC LIMIT 10)")
-                conn.commit()
-                conn.close()
+        short_memory = store.get_last_messages(session_id, window)
+        if memory:
+            # só as memórias antigas parecidas com a pergunta, em vez de todos os resumos
+            context, _ = build_context(user_input, short_memory,
+                                       memories=memory.search(session_id, user_input))
+        else:
+            context, _ = build_context(user_input, short_memory, store.get_last_summaries(session_id, 10))
+        if API_CONFIG["stream"]:
+            bot_reply = print_streamed(stream_ia_response(context, API_CONFIG["instruction"]))
+            if bot_reply is None:
+                continue  # falhou no meio: nada é gravado, a pergunta pode ser repetida
+        else:
+            print("Bob is typing...")
+            bot_reply = get_ia_response(context, API_CONFIG["instruction"])
+            print(f"Bob: {bot_reply}")
+        # a resposta só é gravada depois de completa
+        store.save_message(session_id, user_input, bot_reply, user_id)
+        if memory:
+            # o turno que acabou de sair da janela curta vai para a memória de longo prazo
+            leaving = store.get_message_at(session_id, window)
+            if leaving:
+                worker.submit(memory.add_turn, session_id, *leaving)
+        user_turns = store.count_user_turns(session_id)
+        if user_turns and user_turns % 10 == 0:
+            worker.submit(summarize_job, store, session_id, store.get_user_turns(session_id, 10),
+                          user_id, memory)
+    worker.stop()
+    store.close()
 
 if __name__ == "__main__":
     main()
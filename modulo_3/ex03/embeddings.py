@@ -1,8 +1,11 @@
 
+import os
 import sys
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ex04"))
+from encoder import get_model
+
 
 frases = [
     "O cachorro correu pelo parque atrás da bola azul.",
@@ -25,7 +28,7 @@ if __name__ == "__main__":
 
     consulta = " ".join(sys.argv[1:]).strip()
 
-    model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+    model = get_model()
     consulta_embedding = model.encode(consulta)
     frases_embeddings = model.encode(frases)
 
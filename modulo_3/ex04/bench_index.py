@@ -0,0 +1,52 @@
+import sys
+import time
+import numpy as np
+from store import normalize_rows
+from index import FlatIndex, IVFIndex
+
+
+# Recall@k e latência do índice IVF em relação à busca exata (flat),
+# variando n_probe, num corpus sintético com estrutura de clusters.
+DIM = 384
+TOP_K = 10
+N_QUERIES = 100
+N_PROBES = (1, 2, 4, 8, 16, 32)
+
+
+def synthetic_corpus(n, dim=DIM, n_topics=256, seed=42):
+    # vetores agrupados em "assuntos", como frases reais de uma base de conhecimento
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim), dtype=np.float32)
+    noise = rng.standard_normal((n, dim), dtype=np.float32) * 1.5
+    corpus = normalize_rows(topics[rng.integers(0, n_topics, n)] + noise)
+    queries = normalize_rows(topics[rng.integers(0, n_topics, N_QUERIES)]
+                             + rng.standard_normal((N_QUERIES, dim), dtype=np.float32) * 1.5)
+    return corpus, queries
+
+
+def timed_search(index, queries, **kwargs):
+    start = time.perf_counter()
+    results = [index.search(q[None, :], TOP_K, **kwargs)[0] for q in queries]
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return [{i for i, _ in hits} for hits in results], elapsed
+
+
+def run(n):
+    corpus, queries = synthetic_corpus(n)
+    exact, flat_time = timed_search(FlatIndex(corpus), queries)
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(corpus)
+    build_time = time.perf_counter() - start
+
+    print(f"{n} linhas, {len(ivf.centroids)} clusters, build do IVF: {build_time:.2f}s")
+    print(f"{'índice':>12} {'recall@' + str(TOP_K):>10} {'ms/consulta':>12}")
+    print(f"{'flat':>12} {1.0:>10.3f} {flat_time * 1000:>12.3f}")
+    for n_probe in N_PROBES:
+        found, ivf_time = timed_search(ivf, queries, n_probe=n_probe)
+        recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+        print(f"{'ivf/' + str(n_probe):>12} {recall:>10.3f} {ivf_time * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,59 @@
+import sys
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from store import normalize_rows
+from index import FlatIndex, top_k_indices
+
+
+# Compara a busca antiga (cosine_similarity + sorted em Python) com a atual
+# (matriz pré-normalizada + produto escalar + argpartition) em corpora sintéticos,
+# e mede a busca exata do FlatIndex sobre um store float16 (--float16 do ingest).
+DIM = 384   # dimensão do paraphrase-multilingual-MiniLM-L12-v2
+TOP_K = 3
+REPEAT = 5
+
+
+def old_top_k(query, embeddings, top_k=TOP_K):
+    scores = cosine_similarity(query, embeddings)[0]
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+
+
+def new_top_k(query, normalized, top_k=TOP_K):
+    scores = normalized @ normalize_rows(query)[0]
+    return top_k_indices(scores, top_k)
+
+
+def flat_top_k(query, normalized, top_k=TOP_K):
+    return [i for i, _ in FlatIndex(normalized).search(normalize_rows(query), top_k)[0]]
+
+
+def best_time(fn, *args):
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(sizes):
+    rng = np.random.default_rng(42)
+    print(f"{'linhas':>10} {'antigo (ms)':>12} {'novo (ms)':>10} {'ganho':>7} {'float16 (ms)':>13} {'recall':>7}")
+    for n in sizes:
+        embeddings = rng.standard_normal((n, DIM), dtype=np.float32)
+        normalized = normalize_rows(embeddings)
+        query = rng.standard_normal((1, DIM), dtype=np.float32)
+        assert set(old_top_k(query, embeddings)) == set(new_top_k(query, normalized))
+        half = normalized.astype(np.float16)
+        recall = len(set(flat_top_k(query, half)) & set(new_top_k(query, normalized))) / TOP_K
+        old = best_time(old_top_k, query, embeddings)
+        new = best_time(new_top_k, query, normalized)
+        float16 = best_time(flat_top_k, query, half)
+        print(f"{n:>10} {old * 1000:>12.2f} {new * 1000:>10.2f} {old / new:>6.1f}x "
+              f"{float16 * 1000:>13.2f} {recall:>7.2f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    run(sizes)
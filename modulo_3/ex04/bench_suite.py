@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import encoder
+from encoder import MODEL_NAME
+from ingest import build_store, pop_option
+from store import load_meta, load_store, store_paths
+from index import FlatIndex, IVFIndex
+from rag import retrieve_batch
+
+
+# Benchmark reprodutível da pilha de recuperação com corpora sintéticos:
+# tempo de construção do store e do índice, tempo de abertura, memória,
+# latência p50/p95/p99 por consulta e recall@k de cada backend contra a busca exata.
+#     python3 bench_suite.py [--sizes 10000,100000] [--queries 200] [--top-k 10]
+#                            [--n-probes 1,4,16] [--encoder stub|model] [--float16] [--json saida.json]
+# Com --encoder stub (padrão) roda offline, sem baixar o modelo.
+BENCH_CONFIG = {
+    "sizes": (10_000, 100_000),
+    "queries": 200,
+    "top_k": 10,
+    "n_probes": (1, 4, 16),
+    "dim": 384,          # mesma dimensão do MiniLM
+    "n_topics": 200,     # assuntos do corpus sintético
+    "seed": 42,
+    "batch_size": 1024,
+}
+
+WORDS = ["drone", "bateria", "motor", "hélice", "câmera", "voo", "carga", "sensor", "mapa", "rota",
+         "entrega", "garantia", "peso", "altitude", "vento", "chuva", "sinal", "controle", "pouso",
+         "decolagem", "autonomia", "velocidade", "manutenção", "firmware", "estação", "antena"]
+
+
+class StubEncoder:
+    # Encoder determinístico: cada palavra vira um vetor fixo (semente = hash da palavra)
+    # e o texto é a soma dos vetores das palavras. Textos com palavras em comum ficam
+    # próximos, como num modelo de verdade, mas sem rede nem torch.
+    def __init__(self, dim=BENCH_CONFIG["dim"]):
+        self.dim = dim
+        self.vectors = {}
+
+    def word_vector(self, word):
+        vector = self.vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self.vectors[word] = vector
+        return vector
+
+    def encode(self, texts, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                out[i] += self.word_vector(word)
+        return out
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+
+def synthetic_lines(n, n_topics=BENCH_CONFIG["n_topics"], seed=BENCH_CONFIG["seed"]):
+    # cada linha: palavras-chave do seu assunto + palavras comuns sorteadas
+    rng = np.random.default_rng(seed)
+    topics = [[f"assunto{t}", f"termo{t}a", f"termo{t}b"] for t in range(n_topics)]
+    for i in range(n):
+        topic = topics[rng.integers(n_topics)]
+        words = list(rng.choice(topic, 2, replace=False)) + list(rng.choice(WORDS, 6))
+        yield f"{' '.join(words)} item{i}"
+
+
+def synthetic_queries(lines_file, count, seed=BENCH_CONFIG["seed"]):
+    # perguntas = linhas do corpus com metade das palavras removidas
+    with open(lines_file, "r", encoding="utf-8") as f:
+        lines = [line.split() for line in f]
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for i in rng.choice(len(lines), min(count, len(lines)), replace=False):
+        words = lines[i]
+        keep = rng.choice(len(words), max(1, len(words) // 2), replace=False)
+        queries.append(" ".join(words[j] for j in sorted(keep)))
+    return queries
+
+
+def rss_mb():
+    # memória residente atual do processo (Linux); cai para o pico se /proc não existir
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def disk_mb(prefix):
+    return sum(os.path.getsize(p) for p in store_paths(prefix, load_meta(prefix)).values()) / 2 ** 20
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+
+def time_queries(queries, texts, embeddings, top_k, index=None, n_probe=None):
+    # uma consulta por vez (encode da pergunta + busca), como no servidor
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = retrieve_batch([query], texts, embeddings, top_k, index, n_probe)[0]
+        latencies.append(time.perf_counter() - start)
+        found.append({text for text, _ in hits})
+    return latencies, found
+
+
+def recall(found, exact):
+    return float(np.mean([len(f & e) / max(len(e), 1) for f, e in zip(found, exact)]))
+
+
+def run(n, workdir, queries=BENCH_CONFIG["queries"], top_k=BENCH_CONFIG["top_k"],
+        n_probes=BENCH_CONFIG["n_probes"], dtype="float32"):
+    corpus = os.path.join(workdir, f"corpus_{n}.txt")
+    prefix = os.path.join(workdir, f"store_{n}")
+    with open(corpus, "w", encoding="utf-8") as f:
+        for line in synthetic_lines(n):
+            f.write(line + "\n")
+    result = {"lines": n, "dtype": dtype}
+
+    start = time.perf_counter()
+    build_store(corpus, prefix, batch_size=BENCH_CONFIG["batch_size"], dtype=dtype, reuse=False)
+    result["build_s"] = time.perf_counter() - start
+    result["disk_mb"] = disk_mb(prefix)
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    _, texts, embeddings = load_store(prefix)
+    result["load_ms"] = (time.perf_counter() - start) * 1000
+    result["rss_after_load_mb"] = rss_mb() - rss_before
+
+    questions = synthetic_queries(corpus, queries)
+    flat_latencies, exact = time_queries(questions, texts, embeddings, top_k, FlatIndex(embeddings))
+    result["rss_after_queries_mb"] = rss_mb() - rss_before
+    backends = [{"index": "flat", "recall": 1.0, **percentiles(flat_latencies)}]
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(embeddings)
+    result["ivf_build_s"] = time.perf_counter() - start
+    result["ivf_lists"] = len(ivf.centroids)
+    for n_probe in n_probes:
+        latencies, found = time_queries(questions, texts, embeddings, top_k, ivf, n_probe)
+        backends.append({"index": f"ivf/{n_probe}", "recall": recall(found, exact), **percentiles(latencies)})
+    result["backends"] = backends
+    return result
+
+
+def print_result(r, top_k=BENCH_CONFIG["top_k"]):
+    print(f"\n{r['lines']} linhas ({r['dtype']}): build {r['build_s']:.2f}s "
+          f"({r['lines'] / max(r['build_s'], 1e-9):.0f} linhas/s), disco {r['disk_mb']:.1f} MB, "
+          f"abertura {r['load_ms']:.2f} ms")
+    print(f"memória: +{r['rss_after_load_mb']:.1f} MB após abrir, +{r['rss_after_queries_mb']:.1f} MB "
+          f"após a busca exata; IVF com {r['ivf_lists']} clusters em {r['ivf_build_s']:.2f}s")
+    print(f"{'índice':>10} {'recall@' + str(top_k):>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for b in r["backends"]:
+        print(f"{b['index']:>10} {b['recall']:>10.3f} {b['p50_ms']:>9.3f} {b['p95_ms']:>9.3f} {b['p99_ms']:>9.3f}")
+
+
+def int_list(value, default):
+    return tuple(int(v) for v in value.split(",")) if value else default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sizes = int_list(pop_option(args, "--sizes"), BENCH_CONFIG["sizes"])
+    queries = int(pop_option(args, "--queries", BENCH_CONFIG["queries"]))
+    top_k = int(pop_option(args, "--top-k", BENCH_CONFIG["top_k"]))
+    n_probes = int_list(pop_option(args, "--n-probes"), BENCH_CONFIG["n_probes"])
+    encoder_kind = pop_option(args, "--encoder", "stub")
+    json_file = pop_option(args, "--json")
+    dtype = "float16" if "--float16" in args else "float32"
+
+    if encoder_kind == "stub":
+        encoder._models[MODEL_NAME] = StubEncoder()
+    workdir = tempfile.mkdtemp(prefix="bench_rag_")
+    results = []
+    try:
+        for n in sizes:
+            results.append(run(n, workdir, queries, top_k, n_probes, dtype))
+            print_result(results[-1], top_k)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if json_file:
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump({"encoder": encoder_kind, "top_k": top_k, "results": results}, f, indent=2)
+        print(f"\nResultados gravados em {json_file}")
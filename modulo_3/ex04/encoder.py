@@ -0,0 +1,33 @@
+import os
+import sys
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.timing import span
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+# Registro de modelos já carregados no processo (nome -> modelo)
+_models = {}
+_lock = threading.Lock()
+
+
+def get_model(model_name=MODEL_NAME):
+    model = _models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                # import tardio: só paga o custo do torch quando precisa do modelo
+                with span("encoder.load_model", model=model_name):
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(model_name)
+                _models[model_name] = model
+    return model
+
+
+def warm_up(model_name=MODEL_NAME):
+    # Carrega o modelo e faz um encode curto para a primeira pergunta
+    # não pagar a inicialização
+    model = get_model(model_name)
+    model.encode(["aquecimento"])
+    return model
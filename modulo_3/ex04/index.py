@@ -0,0 +1,163 @@
+import os
+import sys
+import hashlib
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.timing import span
+
+
+# Backends de busca sobre a matriz de embeddings (linhas já normalizadas).
+#   flat: busca exata, compara a pergunta com todas as linhas
+#   ivf:  busca aproximada, agrupa as linhas em clusters (k-means) e só compara
+#         a pergunta com as linhas dos n_probe clusters mais próximos
+INDEX_CONFIG = {
+    "kind": "flat",
+    "n_lists": None,      # None = ~sqrt(número de linhas)
+    "n_probe": 8,         # mais clusters visitados = mais recall e mais latência
+    "train_iters": 10,
+    "chunk_size": 65536,  # linhas por bloco ao atribuir clusters (limita memória)
+    "scan_chunk": 16384,  # linhas por bloco na busca exata (float16 vira float32 só bloco a bloco)
+}
+
+
+def top_k_indices(scores, top_k):
+    # argpartition separa os k maiores em O(n); só esses k são ordenados.
+    # Funciona para um vetor de scores ou para uma matriz (uma linha por pergunta).
+    top_k = min(top_k, scores.shape[-1])
+    if top_k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=int)
+    indices = np.argpartition(-scores, top_k - 1, axis=-1)[..., :top_k]
+    order = np.argsort(-np.take_along_axis(scores, indices, axis=-1), axis=-1)
+    return np.take_along_axis(indices, order, axis=-1)
+
+
+class FlatIndex:
+    kind = "flat"
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def search(self, query_embeddings, top_k, n_probe=None, chunk_size=INDEX_CONFIG["scan_chunk"]):
+        # devolve, para cada pergunta, a lista de (índice da linha, score);
+        # n_probe é aceito só para manter a mesma interface do IVF (a busca é sempre exata).
+        # A matriz é percorrida em blocos float32 de tamanho fixo, guardando só os k melhores
+        # até ali: um store float16 nunca é convertido inteiro para float32 a cada pergunta.
+        queries = np.asarray(query_embeddings, dtype="float32")
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype="float32")
+        with span("index.similarity", rows=len(self.embeddings)):
+            for start in range(0, len(self.embeddings), chunk_size):
+                block = np.asarray(self.embeddings[start:start + chunk_size], dtype="float32")
+                scores = queries @ block.T
+                local = top_k_indices(scores, top_k)
+                ids = np.concatenate((best_ids, local + start), axis=1)
+                scores = np.concatenate((best_scores, np.take_along_axis(scores, local, axis=1)), axis=1)
+                keep = top_k_indices(scores, top_k)
+                best_ids = np.take_along_axis(ids, keep, axis=1)
+                best_scores = np.take_along_axis(scores, keep, axis=1)
+        with span("index.top_k", k=top_k):
+            return [list(zip(ids, scores)) for ids, scores in zip(best_ids, best_scores)]
+
+
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, embeddings, centroids, offsets, ids, n_probe=INDEX_CONFIG["n_probe"]):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.offsets = offsets   # linhas do cluster c: ids[offsets[c]:offsets[c + 1]]
+        self.ids = ids
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, embeddings, n_lists=INDEX_CONFIG["n_lists"], n_probe=INDEX_CONFIG["n_probe"],
+              train_iters=INDEX_CONFIG["train_iters"], seed=0):
+        n = len(embeddings)
+        if not n:
+            # base vazia: índice sem clusters, toda busca devolve [] (como o flat)
+            dim = embeddings.shape[1] if np.ndim(embeddings) == 2 else 0
+            return cls(embeddings, np.empty((0, dim), dtype="float32"), np.zeros(1, dtype=np.int64),
+                       np.empty(0, dtype=np.int64), n_probe)
+        n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        # k-means esférico treinado numa amostra (suficiente para achar os centróides)
+        sample = np.asarray(embeddings[rng.choice(n, min(n, n_lists * 64), replace=False)], dtype="float32")
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(train_iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        assign = assign_clusters(embeddings, centroids)
+        ids = np.argsort(assign, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists))))
+        return cls(embeddings, centroids, offsets, ids, n_probe)
+
+    def search(self, query_embeddings, top_k, n_probe=None):
+        if not len(self.centroids):
+            return [[] for _ in query_embeddings]
+        n_probe = max(1, min(n_probe or self.n_probe, len(self.centroids)))
+        with span("index.probe", n_probe=n_probe):
+            probes = top_k_indices(query_embeddings @ self.centroids.T, n_probe)
+        with span("index.scan", k=top_k):
+            results = []
+            for query, lists in zip(query_embeddings, probes):
+                candidates = np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+                scores = self.embeddings[candidates] @ query
+                results.append([(candidates[i], scores[i]) for i in top_k_indices(scores, top_k)])
+        return results
+
+    def save(self, path, fingerprint=""):
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, ids=self.ids,
+                     fingerprint=np.array(fingerprint))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, embeddings, n_probe=INDEX_CONFIG["n_probe"]):
+        with np.load(path) as data:
+            return (cls(embeddings, data["centroids"], data["offsets"], data["ids"], n_probe),
+                    str(data["fingerprint"]))
+
+
+def assign_clusters(embeddings, centroids, chunk_size=INDEX_CONFIG["chunk_size"]):
+    assign = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), chunk_size):
+        block = np.asarray(embeddings[start:start + chunk_size], dtype="float32")
+        assign[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def fingerprint(texts, embeddings):
+    # identifica o conteúdo do store para saber se o índice salvo ainda vale.
+    # Textos vindos do store (StoreTexts) já trazem o hash do sidecar: não são percorridos.
+    digest = hashlib.sha256(f"{embeddings.shape}:{embeddings.dtype}".encode("utf-8"))
+    if getattr(texts, "fingerprint", None):
+        digest.update(texts.fingerprint.encode("ascii"))
+        return digest.hexdigest()
+    for text in texts:
+        digest.update(text.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def load_or_build_index(texts, embeddings, store_prefix='embeddings', kind=None, n_probe=None):
+    kind = kind or INDEX_CONFIG["kind"]
+    n_probe = n_probe or INDEX_CONFIG["n_probe"]
+    if kind == "flat":
+        return FlatIndex(embeddings)
+    if kind != "ivf":
+        raise ValueError(f"índice desconhecido: {kind}")
+    # o índice IVF fica salvo ao lado do store: <prefixo>.ivf.npz
+    path = f"{store_prefix}.ivf.npz"
+    current = fingerprint(texts, embeddings)
+    if os.path.exists(path):
+        with span("index.load"):
+            index, saved = IVFIndex.load(path, embeddings, n_probe)
+        if saved == current:
+            return index
+    with span("index.build", rows=len(embeddings)):
+        index = IVFIndex.build(embeddings, n_probe=n_probe)
+        index.save(path, current)
+    return index
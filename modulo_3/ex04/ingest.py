@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from encoder import get_model, MODEL_NAME
+from store import text_key, normalize_rows, store_exists, load_store, load_keys, StoreWriter, KEY_DTYPE
+
+
+# Ingestão em fluxo: o arquivo é lido, fatiado e codificado em lotes de tamanho fixo,
+# e cada lote vai direto para o store em disco. O pico de memória depende do lote,
+# não do tamanho do arquivo.
+CHUNK_CONFIG = {
+    "mode": "line",      # line | paragraph | window
+    "window": 64,        # palavras por trecho no modo window
+    "overlap": 16,       # palavras repetidas entre trechos vizinhos no modo window
+    "batch_size": 256,   # trechos por chamada de model.encode
+    "workers": 1,        # processos codificando em paralelo (1 = no próprio processo)
+    "threads": None,     # threads do torch por processo (None = padrão do torch)
+}
+
+
+def read_lines(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+def read_paragraphs(file_path):
+    paragraph = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                paragraph.append(line.strip())
+            elif paragraph:
+                yield " ".join(paragraph)
+                paragraph = []
+    if paragraph:
+        yield " ".join(paragraph)
+
+
+def read_windows(file_path, window=CHUNK_CONFIG["window"], overlap=CHUNK_CONFIG["overlap"]):
+    # "tokens" aproximados por palavras; cada trecho repete as últimas `overlap` palavras do anterior
+    if not 0 <= overlap < window:
+        raise ValueError("overlap deve ser >= 0 e menor que window")
+    words = []
+    pending = False
+    for line in read_lines(file_path):
+        for word in line.split():
+            words.append(word)
+            pending = True
+            if len(words) == window:
+                yield " ".join(words)
+                words = words[window - overlap:]
+                pending = False
+    if pending:
+        yield " ".join(words)
+
+
+def read_chunks(file_path, mode=CHUNK_CONFIG["mode"], **kwargs):
+    readers = {"line": read_lines, "paragraph": read_paragraphs, "window": read_windows}
+    if mode not in readers:
+        raise ValueError(f"modo de fatiamento desconhecido: {mode}")
+    return readers[mode](file_path, **kwargs)
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def init_worker(model_name, threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    get_model(model_name)
+
+
+def encode_batch(batch, model_name=MODEL_NAME):
+    return normalize_rows(get_model(model_name).encode(batch))
+
+
+def chunking_params(mode=CHUNK_CONFIG["mode"], **kwargs):
+    # parâmetros que definem os trechos; ficam gravados no sidecar do store
+    params = {"mode": mode}
+    if mode == "window":
+        params["window"] = int(kwargs.get("window") or CHUNK_CONFIG["window"])
+        params["overlap"] = int(kwargs.get("overlap") if kwargs.get("overlap") is not None
+                                else CHUNK_CONFIG["overlap"])
+    return params
+
+
+def source_stat(file_path):
+    # identifica a versão do arquivo de origem sem lê-lo
+    stat = os.stat(file_path)
+    return {"path": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def store_is_current(meta, file_path, chunking, model_name=MODEL_NAME, dtype=None):
+    # O(1): compara só o sidecar com o arquivo de origem e o fatiamento pedido
+    return (meta.get("source") == source_stat(file_path)
+            and meta.get("chunking") == chunking
+            and meta.get("model_name") == model_name
+            and meta.get("normalized", False)
+            and (dtype is None or meta.get("dtype") == dtype))
+
+
+def previous_vectors(store_prefix, model_name=MODEL_NAME):
+    # vetores de um store anterior, para não recodificar trechos que não mudaram:
+    # chaves ordenadas (busca binária por lote) + matriz mmap
+    if not store_exists(store_prefix):
+        return None
+    meta, _, matrix = load_store(store_prefix)
+    if meta["model_name"] != model_name or not len(matrix):
+        return None
+    keys = load_keys(store_prefix, meta)
+    order = np.argsort(keys)
+    return keys[order], order, matrix
+
+
+def encode_batches(chunks, batch_size, model_name=MODEL_NAME,
+                   workers=CHUNK_CONFIG["workers"], threads=CHUNK_CONFIG["threads"], previous=None):
+    # devolve (lote, chaves, vetores) sempre na ordem de leitura, com ou sem processos.
+    # Com previous (ver previous_vectors), trechos já conhecidos são copiados e só o
+    # resto do lote vai para o modelo.
+    def jobs():
+        for batch in batched(chunks, batch_size):
+            keys = [text_key(t, model_name) for t in batch]
+            rows = [None] * len(batch)
+            if previous:
+                sorted_keys, order, _ = previous
+                wanted = np.array(keys, dtype=KEY_DTYPE)
+                found = np.minimum(np.searchsorted(sorted_keys, wanted), len(sorted_keys) - 1)
+                for i in np.flatnonzero(sorted_keys[found] == wanted):
+                    rows[i] = int(order[found[i]])
+            yield batch, keys, rows, [t for t, row in zip(batch, rows) if row is None]
+
+    def merge(job, vectors):
+        batch, keys, rows, _ = job
+        if all(row is None for row in rows):
+            return batch, keys, vectors
+        new = iter(vectors if vectors is not None else ())
+        matrix = previous[2]
+        return batch, keys, np.stack([np.asarray(matrix[row], dtype="float32") if row is not None else next(new)
+                                      for row in rows])
+
+    if workers <= 1:
+        init_worker(model_name, threads)
+        for job in jobs():
+            yield merge(job, encode_batch(job[3], model_name) if job[3] else None)
+        return
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(model_name, threads)) as pool:
+        # no máximo 2 lotes por processo em voo: mantém todos ocupados sem acumular memória
+        pending = deque()
+        for job in jobs():
+            pending.append((job, pool.submit(encode_batch, job[3], model_name) if job[3] else None))
+            if len(pending) >= workers * 2:
+                job, future = pending.popleft()
+                yield merge(job, future.result() if future else None)
+        while pending:
+            job, future = pending.popleft()
+            yield merge(job, future.result() if future else None)
+
+
+def build_store(file_path, store_prefix='embeddings', mode=CHUNK_CONFIG["mode"],
+                batch_size=CHUNK_CONFIG["batch_size"], model_name=MODEL_NAME, dtype="float32",
+                workers=CHUNK_CONFIG["workers"], threads=CHUNK_CONFIG["threads"], reuse=True, **kwargs):
+    chunking = chunking_params(mode, **kwargs)
+    kwargs = {k: v for k, v in chunking.items() if k != "mode"}
+    source = source_stat(file_path)
+    previous = previous_vectors(store_prefix, model_name) if reuse else None
+
+    # 1ª passada (só leitura): conta os trechos para dimensionar os arquivos do store
+    count = sum(1 for _ in read_chunks(file_path, mode, **kwargs))
+    writer = StoreWriter(store_prefix, count, model_name, dtype)
+
+    # 2ª passada: codifica lote a lote e escreve direto nos arquivos em disco
+    for batch, keys, vectors in encode_batches(read_chunks(file_path, mode, **kwargs), batch_size,
+                                               model_name, workers, threads, previous):
+        writer.append(keys, batch, vectors)
+    dim = None if count else get_model(model_name).get_sentence_embedding_dimension()
+    writer.commit(dim=dim, chunking=chunking, source=source)
+    return count
+
+
+def pop_option(args, name, default=None):
+    if name not in args:
+        return default
+    i = args.index(name)
+    value = args[i + 1]
+    del args[i:i + 2]
+    return value
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python3 ingest.py arquivo.txt [prefixo] [--mode line|paragraph|window] "
+              "[--window N] [--overlap N] [--workers N] [--threads N] [--float16]")
+        sys.exit(1)
+    args = sys.argv[1:]
+    mode = pop_option(args, "--mode", CHUNK_CONFIG["mode"])
+    window = pop_option(args, "--window")
+    overlap = pop_option(args, "--overlap")
+    workers = int(pop_option(args, "--workers", CHUNK_CONFIG["workers"]))
+    threads = pop_option(args, "--threads", CHUNK_CONFIG["threads"])
+    dtype = "float16" if "--float16" in args else "float32"
+    args = [a for a in args if a != "--float16"]
+    prefix = args[1] if len(args) > 1 else "embeddings"
+    start = time.perf_counter()
+    count = build_store(args[0], prefix, mode, dtype=dtype, workers=workers,
+                        threads=int(threads) if threads else None, window=window, overlap=overlap)
+    elapsed = time.perf_counter() - start
+    print(f"{count} trechos codificados no store {prefix}.* ({mode}, {dtype})")
+    print(f"{elapsed:.1f}s com {workers} processo(s): {count / max(elapsed, 1e-9):.1f} trechos/s")
@@ -1,11 +1,15 @@
 import os
 import sys
-import pickle
 from dotenv import load_dotenv
-from google import genai
 from google.genai import types
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from encoder import get_model, MODEL_NAME
+from ingest import build_store, chunking_params, store_is_current, pop_option, CHUNK_CONFIG
+from index import FlatIndex, load_or_build_index
+from store import normalize_rows, store_exists, load_meta, load_store, convert_pickle
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.client import get_client
+from shared.timing import span, timed, enable, report, write_trace
+from shared.scheduler import generate_content
 
 
 # Configuração da API - ex01/ex02
@@ -18,6 +22,7 @@ Seja preciso, claro e direto. Se a informação não estiver disponível no cont
 informe que não possui essa informação específica."""
 }
 
+@timed("llm.get_ia_response")
 def get_ia_response(ask, 
                     instruction=API_CONFIG["instruction"],
                     model_name=API_CONFIG["model_name"], 
@@ -28,8 +33,8 @@ def get_ia_response(ask,
         if not api_key:
             return "[Erro: GEMINI_API_KEY não encontrada no arquivo .env]"
         
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
+        client = get_client(api_key)
+        response = generate_content(client,
             model=model_name,
             contents=ask,
             config=types.GenerateContentConfig(
@@ -49,49 +54,71 @@ def get_ia_response(ask,
 
 
 #   - ex03
-def load_knowledge_base(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f.readlines() if line.strip()]
-        return lines
-    except FileNotFoundError:
+@timed("rag.load_knowledge_base")
+def load_knowledge_base(file_path, store_prefix='embeddings', mode=None, dtype=None, **kwargs):
+    # A base fica no store em disco (textos e vetores abertos com mmap).
+    # Fatiamento: o pedido aqui; senão o gravado no store (ex.: por ingest.py --mode paragraph);
+    # senão o de CHUNK_CONFIG.
+    if not os.path.exists(file_path):
         print(f"Erro: Arquivo {file_path} não encontrado.")
         sys.exit(1)
+    if mode is None and store_exists(store_prefix):
+        chunking = load_meta(store_prefix).get("chunking") or chunking_params()
+    else:
+        chunking = chunking_params(mode or CHUNK_CONFIG["mode"], **kwargs)
+    try:
+        return get_embeddings(file_path, store_prefix, chunking, dtype=dtype)
     except Exception as e:
         print(f"Erro ao carregar arquivo: {e}")
         sys.exit(1)
 
 
-def get_embeddings(texts, cache_file='embeddings.pkl'):
-    if os.path.exists(cache_file):
-        with open(cache_file, 'rb') as f:
-            data = pickle.load(f)
-            return data['texts'], data['embeddings']
-    else:
-        model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-        embeddings = model.encode(texts)
-        with open(cache_file, 'wb') as f:
-            pickle.dump({'texts': texts, 'embeddings': embeddings}, f)
-        return texts, embeddings
-
-
-def retrieve_relevant_lines(query, texts, embeddings, top_k=3):
-    model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-    query_embedding = model.encode([query])
-    scores = cosine_similarity(query_embedding, embeddings)[0]
-    top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-    relevant_lines = []
-    for i in top_indices:
-        relevant_lines.append((texts[i], scores[i]))
-    return relevant_lines
+@timed("rag.get_embeddings")
+def get_embeddings(file_path, store_prefix='embeddings', chunking=None, model_name=MODEL_NAME, dtype=None):
+    chunking = chunking or chunking_params()
+    # migra o cache antigo em pickle para o store mmap na primeira execução
+    legacy_pickle = f"{store_prefix}.pkl"
+    if not store_exists(store_prefix) and os.path.exists(legacy_pickle):
+        convert_pickle(legacy_pickle, store_prefix, dtype or "float32", model_name)
+
+    if store_exists(store_prefix):
+        meta = load_meta(store_prefix)
+        dtype = dtype or meta["dtype"]
+        if store_is_current(meta, file_path, chunking, model_name, dtype):
+            return load_store(store_prefix)[1:]
+    # store ausente ou desatualizado: refeito em lotes, e só os trechos novos
+    # ou alterados passam pelo modelo (os demais vetores são copiados do store anterior)
+    with span("store.build", file=file_path):
+        build_store(file_path, store_prefix, model_name=model_name, dtype=dtype or "float32", **chunking)
+    return load_store(store_prefix)[1:]
+
+
+def retrieve_batch(queries, texts, embeddings, top_k=3, index=None, n_probe=None):
+    # um único encode para todas as perguntas; a busca fica a cargo do índice
+    # (flat = exato, produto perguntas x corpus; ivf = aproximado, ver index.py).
+    # n_probe troca recall por latência no ivf; None usa o valor do índice
+    index = index or FlatIndex(embeddings)
+    with span("retrieve.encode_query", queries=len(queries)):
+        query_embeddings = normalize_rows(get_model().encode(list(queries)))
+    results = []
+    for hits in index.search(query_embeddings, top_k, n_probe=n_probe):
+        results.append([(texts[i], score) for i, score in hits])
+    return results
+
+
+@timed("rag.retrieve_relevant_lines")
+def retrieve_relevant_lines(query, texts, embeddings, top_k=3, index=None, n_probe=None):
+    return retrieve_batch([query], texts, embeddings, top_k, index, n_probe)[0]
 
 
 #   - ex04
+@timed("rag.generate_rag_response")
 def generate_rag_response(query, relevant_lines):
 
-    context = "\n".join([f"- {line}" for line, _ in relevant_lines])
+    with span("rag.prompt_build"):
+        context = "\n".join([f"- {line}" for line, _ in relevant_lines])
     
-    prompt = f"""
+        prompt = f"""
 Pergunta: {query}
 
 Contexto recuperado da base de conhecimento da Orbit Motordrones:
@@ -102,18 +129,76 @@ Com base apenas nas informações fornecidas acima, responda à pergunta de form
     return get_ia_response(prompt)
 
 
+def read_questions(source):
+    f = sys.stdin if source == "-" else open(source, 'r', encoding='utf-8')
+    try:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def answer_batch(source, texts, embeddings, index=None, batch_size=32, top_k=3, n_probe=None):
+    # perguntas são agrupadas em lotes para o encode, e as respostas saem uma a uma
+    batch = []
+    for question in read_questions(source):
+        batch.append(question)
+        if len(batch) == batch_size:
+            print_batch(batch, retrieve_batch(batch, texts, embeddings, top_k, index, n_probe))
+            batch = []
+    if batch:
+        print_batch(batch, retrieve_batch(batch, texts, embeddings, top_k, index, n_probe))
+
+
+def print_batch(queries, results):
+    for query, relevant_lines in zip(queries, results):
+        print(f"Pergunta: {query}")
+        print(generate_rag_response(query, relevant_lines))
+        print("----------------------------------------", flush=True)
+
+
 def main():
     load_dotenv()
     
-    if len(sys.argv) < 2:
-        print("Uso: python3 rag.py \"sua pergunta sobre a Orbit Motordrones\"")
+    args = sys.argv[1:]
+    kind = pop_option(args, "--index")
+    n_probe = pop_option(args, "--n-probe")
+    n_probe = int(n_probe) if n_probe else None
+    trace_file = pop_option(args, "--trace")
+    profile = "--profile" in args or trace_file is not None
+    args = [a for a in args if a != "--profile"]
+    if not args:
+        print("Uso: python3 rag.py [opções] \"sua pergunta sobre a Orbit Motordrones\"")
+        print("     python3 rag.py [opções] --batch [arquivo_de_perguntas | -]")
+        print("Opções: --index flat|ivf, --n-probe N, --profile (tempo por etapa no stderr), "
+              "--trace arquivo.json (trace para chrome://tracing)")
         sys.exit(1)
-    
-    query = " ".join(sys.argv[1:]).strip()
+
+    if profile:
+        enable()
+    try:
+        run(args, kind, n_probe)
+    finally:
+        if profile:
+            report()
+        if trace_file:
+            write_trace(trace_file)
+            print(f"Trace gravado em {trace_file}", file=sys.stderr)
+
+
+def run(args, kind=None, n_probe=None):
     file = "orbit_motordrones.txt"
-    texts = load_knowledge_base(file)
-    texts, embeddings = get_embeddings(texts)
-    relevant_lines = retrieve_relevant_lines(query, texts, embeddings, top_k=3)
+    texts, embeddings = load_knowledge_base(file)
+    index = load_or_build_index(texts, embeddings, kind=kind, n_probe=n_probe)
+
+    if args[0] == "--batch":
+        answer_batch(args[1] if len(args) > 1 else "-", texts, embeddings, index, n_probe=n_probe)
+        return
+
+    query = " ".join(args).strip()
+    relevant_lines = retrieve_relevant_lines(query, texts, embeddings, top_k=3, index=index, n_probe=n_probe)
     
     print("---- Linhas relevantes recuperadas: ----")
     for line, score in relevant_lines:
@@ -124,4 +209,4 @@ def main():
     print(response)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from encoder import warm_up
+from index import load_or_build_index
+from rag import load_knowledge_base, retrieve_relevant_lines, generate_rag_response
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.timing import enable, stage_stats, TIMING_CONFIG
+
+
+SERVER_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8000,
+    "knowledge_base": "orbit_motordrones.txt",
+    "top_k": 3,
+}
+
+# Estado residente: base de conhecimento e embeddings carregados uma única vez
+STATE = {"texts": [], "embeddings": None, "index": None}
+
+
+def load_state(file=SERVER_CONFIG["knowledge_base"]):
+    warm_up()
+    STATE["texts"], STATE["embeddings"] = load_knowledge_base(file)
+    STATE["index"] = load_or_build_index(STATE["texts"], STATE["embeddings"])
+
+
+def answer(query, top_k=SERVER_CONFIG["top_k"], generate=True, n_probe=None):
+    relevant_lines = retrieve_relevant_lines(query, STATE["texts"], STATE["embeddings"],
+                                             top_k=top_k, index=STATE["index"], n_probe=n_probe)
+    result = {
+        "query": query,
+        "lines": [{"text": line, "score": float(score)} for line, score in relevant_lines],
+    }
+    if generate:
+        result["response"] = generate_rag_response(query, relevant_lines)
+    return result
+
+
+class RagHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "lines": len(STATE["texts"])})
+        elif self.path == "/metrics":
+            # latência por etapa desde o início (só com --profile)
+            self.send_json(200, {"enabled": TIMING_CONFIG["enabled"], "stages": stage_stats()})
+        else:
+            self.send_json(404, {"error": "rota não encontrada"})
+
+    def do_POST(self):
+        if self.path not in ("/query", "/retrieve"):
+            self.send_json(404, {"error": "rota não encontrada"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(data, dict):
+                raise ValueError("o corpo deve ser um objeto JSON")
+            query = str(data.get("query", "")).strip()
+            top_k = int(data.get("top_k", SERVER_CONFIG["top_k"]))
+            n_probe = int(data["n_probe"]) if data.get("n_probe") is not None else None
+            if top_k < 1 or (n_probe is not None and n_probe < 1):
+                raise ValueError("'top_k' e 'n_probe' devem ser inteiros >= 1")
+        except (ValueError, TypeError) as e:
+            # json.JSONDecodeError é subclasse de ValueError
+            self.send_json(400, {"error": f"requisição inválida: {e}"})
+            return
+        if not query:
+            self.send_json(400, {"error": "campo 'query' é obrigatório"})
+            return
+        try:
+            result = answer(query, top_k, generate=self.path == "/query", n_probe=n_probe)
+        except Exception as e:
+            # uma falha no encoder ou no índice vira resposta de erro, não conexão derrubada
+            self.send_json(500, {"error": f"erro interno: {e}"})
+            return
+        self.send_json(200, result)
+
+
+def serve(host=SERVER_CONFIG["host"], port=SERVER_CONFIG["port"]):
+    load_state()
+    server = ThreadingHTTPServer((host, port), RagHandler)
+    print(f"Servidor RAG em http://{host}:{port} ({len(STATE['texts'])} linhas carregadas)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    if "--profile" in sys.argv:
+        enable()
+    args = [a for a in sys.argv[1:] if a != "--profile"]
+    port = int(args[0]) if args else SERVER_CONFIG["port"]
+    serve(port=port)
+
+
+# Exemplo de uso:
+#     python3 server.py 8000 [--profile]
+#     curl -s localhost:8000/query -d '{"query": "Quais drones a Orbit fabrica?"}'
+#     curl -s localhost:8000/retrieve -d '{"query": "autonomia da bateria", "top_k": 5}'
+#     curl -s localhost:8000/retrieve -d '{"query": "autonomia da bateria", "n_probe": 16}'   (índice ivf)
+#     curl -s localhost:8000/metrics   (p50/p95/p99 por etapa, com --profile)
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import pickle
+import uuid
+import hashlib
+import unicodedata
+import numpy as np
+from numpy.lib.format import open_memmap
+from encoder import MODEL_NAME
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.timing import span
+
+
+# Store em disco, tudo aberto com mmap (abrir é O(1) e as páginas vêm do page cache,
+# compartilhadas entre processos). Cada gravação cria uma geração nova de arquivos:
+#   <prefixo>.<geração>.npy          matriz de vetores, linhas já normalizadas
+#   <prefixo>.<geração>.texts.bin    textos em UTF-8, um após o outro
+#   <prefixo>.<geração>.offsets.npy  texto i = texts.bin[offsets[i]:offsets[i + 1]]
+#   <prefixo>.<geração>.keys.npy     chave de conteúdo de cada linha (para reaproveitar vetores)
+#   <prefixo>.json                   sidecar pequeno: modelo, dtype, formato, os arquivos da
+#                                    geração atual e uma impressão digital do conteúdo
+# Só o sidecar é trocado (um único os.replace, atômico): quem o lê vê sempre uma geração
+# completa. Stores sem "files" no sidecar usam os nomes fixos antigos (<prefixo>.npy etc.).
+STORE_DTYPES = ("float32", "float16")
+KEY_DTYPE = "S64"  # sha256 em hexadecimal
+DATA_FILES = {"matrix": ".npy", "texts": ".texts.bin", "offsets": ".offsets.npy", "keys": ".keys.npy"}
+
+
+def text_key(text, model_name=MODEL_NAME):
+    # Chave de conteúdo: o mesmo texto com o mesmo modelo gera sempre o mesmo vetor
+    normalized = unicodedata.normalize("NFC", " ".join(text.split()))
+    return hashlib.sha256(f"{model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def normalize_rows(matrix):
+    # vetores com norma L2 = 1: a similaridade de cosseno vira um produto escalar
+    matrix = np.asarray(matrix, dtype="float32")
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def store_paths(prefix, meta=None):
+    # arquivos da geração listada no sidecar (meta), ou os nomes fixos do layout antigo
+    files = (meta or {}).get("files")
+    directory = os.path.dirname(prefix)
+    paths = {name: os.path.join(directory, files[name]) if files else prefix + suffix
+             for name, suffix in DATA_FILES.items()}
+    paths["meta"] = f"{prefix}.json"
+    return paths
+
+
+def store_exists(prefix):
+    if not os.path.exists(f"{prefix}.json"):
+        return False
+    try:
+        meta = load_meta(prefix)
+    except (OSError, ValueError):
+        return False
+    paths = store_paths(prefix, meta)
+    # formato 1 (textos dentro do JSON) só tem a matriz; é convertido ao abrir
+    required = ["matrix"] if "texts" in meta else list(DATA_FILES)
+    return all(os.path.exists(paths[name]) for name in required)
+
+
+class StoreTexts:
+    # Sequência de textos lida sob demanda do blob mmap: nada é decodificado até ser usado
+
+    def __init__(self, blob, offsets, fingerprint=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.fingerprint = fingerprint  # hash das chaves, vindo do sidecar
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class StoreWriter:
+    # Grava um store em lotes numa geração nova de arquivos, que ninguém lê até o commit():
+    # aí o sidecar passa a apontar para ela num único os.replace, e a geração anterior é apagada
+    # (processos que já a abriram continuam lendo pelo mmap).
+
+    def __init__(self, prefix, count, model_name=MODEL_NAME, dtype="float32"):
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"dtype deve ser um de {STORE_DTYPES}")
+        self.prefix = prefix
+        generation = uuid.uuid4().hex[:12]
+        self.files = {name: f"{os.path.basename(prefix)}.{generation}{suffix}" for name, suffix in DATA_FILES.items()}
+        self.paths = store_paths(prefix, {"files": self.files})
+        self.count = count
+        self.model_name = model_name
+        self.dtype = dtype
+        self.row = 0
+        self.matrix = None
+        self.offsets = open_memmap(self.paths["offsets"], mode="w+", dtype="int64", shape=(count + 1,))
+        self.offsets[0] = 0
+        self.keys = open_memmap(self.paths["keys"], mode="w+", dtype=KEY_DTYPE, shape=(count,))
+        self.blob = open(self.paths["texts"], "wb")
+        self.digest = hashlib.sha256()
+
+    def append(self, keys, texts, vectors):
+        # vectors já normalizados
+        end = self.row + len(keys)
+        if self.matrix is None:
+            self.matrix = open_memmap(self.paths["matrix"], mode="w+", dtype=self.dtype,
+                                      shape=(self.count, vectors.shape[1]))
+        self.matrix[self.row:end] = np.asarray(vectors).astype(self.dtype)
+        self.keys[self.row:end] = [k.encode("ascii") for k in keys]
+        position = int(self.offsets[self.row])
+        for i, text in enumerate(texts, self.row + 1):
+            data = text.encode("utf-8")
+            self.blob.write(data)
+            position += len(data)
+            self.offsets[i] = position
+        for key in keys:
+            self.digest.update(key.encode("ascii") + b"\n")
+        self.row = end
+
+    def commit(self, dim=None, **extra):
+        if self.row != self.count:
+            raise ValueError(f"store com {self.row} de {self.count} linhas gravadas")
+        if self.matrix is None:
+            self.matrix = open_memmap(self.paths["matrix"], mode="w+", dtype=self.dtype,
+                                      shape=(0, dim or 0))
+        shape = list(self.matrix.shape)
+        for array in (self.matrix, self.offsets, self.keys):
+            array.flush()
+        self.blob.close()
+        self.matrix = self.offsets = self.keys = None
+        meta = {
+            "format": 3,
+            "model_name": self.model_name,
+            "dtype": self.dtype,
+            "normalized": True,
+            "shape": shape,
+            "fingerprint": self.digest.hexdigest(),
+            "files": self.files,
+            **extra,
+        }
+        try:
+            old_paths = store_paths(self.prefix, load_meta(self.prefix))
+        except (OSError, ValueError):
+            old_paths = None
+        with open(self.paths["meta"] + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.paths["meta"] + ".tmp", self.paths["meta"])
+        if old_paths:
+            for name in DATA_FILES:
+                if old_paths[name] != self.paths[name]:
+                    try:
+                        os.remove(old_paths[name])
+                    except FileNotFoundError:
+                        pass
+        return meta
+
+
+def save_store(prefix, keys, texts, embeddings, model_name=MODEL_NAME, dtype="float32", **extra):
+    matrix = normalize_rows(embeddings)
+    writer = StoreWriter(prefix, len(keys), model_name, dtype)
+    if len(keys):
+        writer.append(list(keys), list(texts), matrix)
+    return writer.commit(dim=matrix.shape[1] if matrix.ndim == 2 else None, **extra)
+
+
+def upgrade_store(prefix, meta):
+    # store do formato antigo (chaves e textos dentro do JSON): regrava no formato atual
+    matrix = np.load(store_paths(prefix, meta)["matrix"], mmap_mode="r")
+    save_store(prefix, meta["keys"], meta["texts"], matrix, meta["model_name"], meta["dtype"])
+
+
+def load_meta(prefix):
+    with open(store_paths(prefix)["meta"], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_store(prefix):
+    with span("store.open", prefix=prefix):
+        return open_store(prefix)
+
+
+def open_store(prefix, attempts=3):
+    for attempt in range(attempts):
+        meta = load_meta(prefix)
+        if "texts" in meta:
+            upgrade_store(prefix, meta)
+            continue
+        paths = store_paths(prefix, meta)
+        try:
+            matrix = np.load(paths["matrix"], mmap_mode="r")
+            offsets = np.load(paths["offsets"], mmap_mode="r")
+            # np.memmap não aceita arquivo vazio (base sem nenhum trecho)
+            if os.path.getsize(paths["texts"]):
+                blob = np.memmap(paths["texts"], dtype="uint8", mode="r")
+            else:
+                blob = np.empty(0, dtype="uint8")
+        except FileNotFoundError:
+            # outro processo gravou uma geração nova e apagou esta entre a leitura
+            # do sidecar e a abertura dos dados: relê o sidecar
+            if attempt == attempts - 1:
+                raise
+            continue
+        if list(matrix.shape) != meta["shape"] or len(offsets) != matrix.shape[0] + 1:
+            raise ValueError(f"store {prefix} inconsistente: matriz e sidecar não correspondem")
+        return meta, StoreTexts(blob, offsets, meta["fingerprint"]), matrix
+    return open_store(prefix, 1)
+
+
+def load_keys(prefix, meta=None):
+    # passe o meta devolvido por load_store para ler as chaves da mesma geração
+    return np.load(store_paths(prefix, meta or load_meta(prefix))["keys"], mmap_mode="r")
+
+
+def convert_pickle(pickle_file, prefix, dtype="float32", model_name=MODEL_NAME):
+    with open(pickle_file, "rb") as f:
+        data = pickle.load(f)
+    texts = list(data["texts"])
+    keys = data.get("keys") or [text_key(t, model_name) for t in texts]
+    save_store(prefix, keys, texts, data["embeddings"], model_name, dtype)
+    return len(texts)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python3 store.py embeddings.pkl [prefixo_destino] [--float16]")
+        sys.exit(1)
+    args = [a for a in sys.argv[1:] if a != "--float16"]
+    dtype = "float16" if "--float16" in sys.argv else "float32"
+    source = args[0]
+    prefix = args[1] if len(args) > 1 else os.path.splitext(source)[0]
+    count = convert_pickle(source, prefix, dtype)
+    print(f"{count} vetores convertidos para o store {prefix}.* ({dtype})")
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+# Cache de respostas do modelo para chamadas determinísticas.
+# Dois níveis: LRU em memória (processo) e SQLite em disco (entre execuções),
+# com validade (TTL) e limite de entradas. Por padrão só é usado com temperature 0;
+# GENAI_CACHE=1 liga e GENAI_CACHE=0 desliga para qualquer temperatura.
+CACHE_CONFIG = {
+    "db_file": "genai_cache.db",
+    "memory_size": 256,          # entradas no LRU em memória
+    "max_entries": 10000,        # entradas no SQLite antes de descartar as menos usadas
+    "evict_fraction": 0.1,       # ao passar do limite, descarta também esta fração a mais (folga)
+    "ttl": 7 * 24 * 3600,        # segundos até uma resposta em disco expirar
+}
+
+
+def schema_repr(schema):
+    if schema is None:
+        return None
+    if hasattr(schema, "model_json_schema"):
+        return schema.model_json_schema()
+    try:
+        # tipos compostos, ex.: list[Person]
+        from pydantic import TypeAdapter
+        return TypeAdapter(schema).json_schema()
+    except Exception:
+        return repr(schema)
+
+
+def cache_key(model, contents, instruction=None, temperature=None, schema=None):
+    contents_hash = hashlib.sha256(json.dumps(contents, ensure_ascii=False, default=repr).encode("utf-8")).hexdigest()
+    key = json.dumps([model, instruction, temperature, schema_repr(schema), contents_hash],
+                     ensure_ascii=False, sort_keys=True, default=repr)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(self, config=CACHE_CONFIG):
+        self.config = config
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.conn = None
+        self.rows = None  # contagem aproximada das linhas em disco (evita COUNT(*) a cada set)
+
+    def db(self):
+        # o arquivo só é criado na primeira consulta com cache ligado
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.config["db_file"], check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                            key TEXT PRIMARY KEY,
+                            value TEXT,
+                            created_at REAL,
+                            last_access REAL
+                        )''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses (last_access)")
+        return self.conn
+
+    def remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.config["memory_size"]:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self.memory[key]
+            now = time.time()
+            row = self.db().execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.config["ttl"]:
+                self.db().execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self.remember(key, row[0])
+                self.stats["disk_hits"] += 1
+                return row[0]
+            if row:
+                self.db().execute("DELETE FROM responses WHERE key = ?", (key,))
+                if self.rows:
+                    self.rows -= 1
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        with self.lock:
+            now = time.time()
+            self.remember(key, value)
+            db = self.db()
+            db.execute("INSERT OR REPLACE INTO responses (key, value, created_at, last_access) "
+                       "VALUES (?, ?, ?, ?)", (key, value, now, now))
+            # a contagem só sobe (um REPLACE conta como linha nova): o COUNT(*) exato roda
+            # na primeira gravação e quando a estimativa passa do limite, e o descarte
+            # abre folga de evict_fraction para que isso não se repita a cada miss
+            self.rows = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if self.rows is None else self.rows + 1
+            if self.rows > self.config["max_entries"]:
+                self.rows = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                excess = self.rows - self.config["max_entries"]
+                if excess > 0:
+                    excess += int(self.config["max_entries"] * self.config["evict_fraction"])
+                    db.execute("DELETE FROM responses WHERE key IN "
+                               "(SELECT key FROM responses ORDER BY last_access LIMIT ?)", (excess,))
+                    self.rows = max(0, self.rows - excess)
+
+
+_cache = ResponseCache()
+
+
+def cache_enabled(temperature):
+    flag = os.getenv("GENAI_CACHE")
+    if flag is not None:
+        return flag.strip().lower() in ("1", "true", "yes", "sim")
+    return temperature == 0
+
+
+def cached_response(generate, model, contents, instruction=None, temperature=None, schema=None):
+    # generate() só é chamada em caso de miss; exceções não são guardadas no cache
+    if not cache_enabled(temperature):
+        return generate()
+    key = cache_key(model, contents, instruction, temperature, schema)
+    value = _cache.get(key)
+    if value is None:
+        value = generate()
+        _cache.set(key, value)
+    return value
+
+
+def cached_future(submit, model, contents, instruction=None, temperature=None, schema=None):
+    # versão não bloqueante de cached_response: submit() devolve um Future com o texto;
+    # num hit o Future já vem resolvido, num miss o resultado é guardado quando chegar
+    if not cache_enabled(temperature):
+        return submit()
+    key = cache_key(model, contents, instruction, temperature, schema)
+    value = _cache.get(key)
+    if value is not None:
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def store(done):
+        if not done.cancelled() and done.exception() is None:
+            _cache.set(key, done.result())
+
+    future = submit()
+    future.add_done_callback(store)
+    return future
+
+
+def cache_stats():
+    return dict(_cache.stats)
+
+
+def report_cache(file=sys.stderr):
+    # resumo de acertos do cache no fim de um script (nada se o cache não foi consultado)
+    stats = cache_stats()
+    lookups = sum(stats.values())
+    if not lookups:
+        return
+    hits = stats["memory_hits"] + stats["disk_hits"]
+    print(f"cache: {hits}/{lookups} acertos ({stats['memory_hits']} em memória, {stats['disk_hits']} em disco), "
+          f"{stats['misses']} misses", file=file)
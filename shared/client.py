@@ -0,0 +1,47 @@
+import os
+import threading
+import httpx
+from google import genai
+from google.genai import types
+
+
+# Cliente único por processo: a conexão HTTP (TLS + keep-alive) é reaproveitada
+# entre as chamadas em vez de abrir um genai.Client novo a cada pergunta.
+CLIENT_CONFIG = {
+    "timeout": 60.0,                 # segundos por requisição
+    "max_connections": 10,           # tamanho do pool de conexões
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 120.0,       # segundos que uma conexão ociosa fica aberta
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def http_options(base_url=None, config=CLIENT_CONFIG):
+    limits = httpx.Limits(
+        max_connections=config["max_connections"],
+        max_keepalive_connections=config["max_keepalive_connections"],
+        keepalive_expiry=config["keepalive_expiry"],
+    )
+    return types.HttpOptions(
+        base_url=base_url,
+        timeout=int(config["timeout"] * 1000),  # o SDK espera milissegundos
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+
+
+def get_client(api_key=None):
+    # GEMINI_BASE_URL permite apontar para um servidor local (ex.: um stub em testes)
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    base_url = os.getenv("GEMINI_BASE_URL")
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = genai.Client(api_key=api_key, http_options=http_options(base_url))
+                _clients[key] = client
+    return client
@@ -0,0 +1,49 @@
+# Monta o contexto dos chatbots dentro de um orçamento de tokens.
+# Prioridade: a pergunta atual (sempre entra), depois os turnos mais recentes,
+# depois as memórias recuperadas por relevância e por fim os resumos mais recentes.
+# As partes são unidas uma única vez no final.
+CONTEXT_CONFIG = {
+    "max_tokens": 2000,
+    "chars_per_token": 4,    # estimativa grosseira, sem depender do tokenizer do modelo
+    "show_metrics": False,   # imprime o tamanho do prompt a cada turno
+}
+
+
+def estimate_tokens(text, chars_per_token=CONTEXT_CONFIG["chars_per_token"]):
+    return -(-len(text) // chars_per_token)  # divisão arredondando para cima
+
+
+def take_newest(pieces, budget):
+    # percorre do mais novo para o mais antigo e para no primeiro que não cabe
+    selected = []
+    for piece in reversed(pieces):
+        cost = estimate_tokens(piece)
+        if cost > budget:
+            break
+        selected.append(piece)
+        budget -= cost
+    return selected[::-1], budget
+
+
+def build_context(user_input, turns=(), summaries=(), max_tokens=None, memories=()):
+    max_tokens = max_tokens or CONTEXT_CONFIG["max_tokens"]
+    current = f"User: {user_input}\nBot: "
+    budget = max_tokens - estimate_tokens(current)
+    turn_parts, budget = take_newest([f"User: {u}\nBot: {b}\n" for u, b in turns], budget)
+    memory_parts, budget = take_newest([f"Memória: {m}\n" for m in memories], budget)
+    summary_parts, budget = take_newest([f"Resumo: {s}\n" for s in summaries], budget)
+    context = "".join(summary_parts + memory_parts + turn_parts + [current])
+    metrics = {
+        "tokens": estimate_tokens(context),
+        "max_tokens": max_tokens,
+        "turns": len(turn_parts),
+        "dropped_turns": len(turns) - len(turn_parts),
+        "memories": len(memory_parts),
+        "dropped_memories": len(memories) - len(memory_parts),
+        "summaries": len(summary_parts),
+        "dropped_summaries": len(summaries) - len(summary_parts),
+    }
+    if CONTEXT_CONFIG["show_metrics"]:
+        print(f"[contexto: ~{metrics['tokens']}/{max_tokens} tokens, {metrics['turns']} turnos, "
+              f"{metrics['memories']} memórias, {metrics['summaries']} resumos]")
+    return context, metrics
@@ -0,0 +1,156 @@
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Servidor falso da API do Gemini, para testar os scripts sem rede nem chave:
+#     python3 shared/fake_gemini.py 8765 [--fail-after N] [--latency S] [--rate-limit-every N] [--error-rate P]
+#     GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=teste python3 modulo_3/ex01/chatbot.py
+# Responde generateContent (JSON) e streamGenerateContent (SSE, um evento por palavra),
+# e pode simular latência e limites de taxa (429) para testar o agendador (shared/scheduler.py).
+FAKE_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "chunk_delay": 0.05,       # segundos entre os pedaços do stream
+    "fail_after": None,        # derruba a conexão depois de N pedaços do stream (falha no meio)
+    "latency": 0.0,            # segundos antes de cada resposta (com até 50% de variação)
+    "rate_limit_every": 0,     # responde 429 a cada N-ésima requisição (0 = nunca)
+    "error_rate": 0.0,         # fração de requisições respondidas com 429 ao acaso
+    "retry_after": None,       # segundos sugeridos no cabeçalho Retry-After dos 429
+}
+
+_counter = {"requests": 0, "rate_limited": 0}
+_counter_lock = threading.Lock()
+
+
+def candidate(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+
+
+def prompt_text(body):
+    # o texto da última mensagem do usuário, para a resposta falsa ecoar
+    try:
+        return body["contents"][-1]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def fake_reply(body):
+    prompt = " ".join(prompt_text(body).split())
+    return f"Resposta falsa para: {prompt[-60:]}"
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = FAKE_CONFIG
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def stream(self, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if self.config["fail_after"] is not None and i >= self.config["fail_after"]:
+                # sem o pedaço final: o cliente vê a conexão cair no meio da resposta
+                self.close_connection = True
+                return
+            piece = word if i == 0 else " " + word
+            self.write_chunk(f"data: {json.dumps(candidate(piece), ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+            time.sleep(self.config["chunk_delay"])
+        self.write_chunk(b"")
+
+    def rate_limited(self):
+        with _counter_lock:
+            _counter["requests"] += 1
+            every = self.config["rate_limit_every"]
+            limited = (every and _counter["requests"] % every == 0) or random.random() < self.config["error_rate"]
+            if limited:
+                _counter["rate_limited"] += 1
+        return limited
+
+    def send_rate_limit(self):
+        body = json.dumps({"error": {"code": 429, "message": "Resource has been exhausted (simulado)",
+                                     "status": "RESOURCE_EXHAUSTED"}}).encode("utf-8")
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if self.config["retry_after"] is not None:
+            self.send_header("Retry-After", str(self.config["retry_after"]))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # contadores, para conferir quantos 429 o cliente recebeu
+        if self.path == "/stats":
+            self.send_json(200, dict(_counter))
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": "rota não encontrada", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_json(400, {"error": {"code": 400, "message": "JSON inválido", "status": "INVALID_ARGUMENT"}})
+            return
+        if self.config["latency"]:
+            time.sleep(self.config["latency"] * random.uniform(0.5, 1.5))
+        if self.rate_limited():
+            self.send_rate_limit()
+            return
+        if ":streamGenerateContent" in self.path:
+            self.stream(fake_reply(body))
+        elif ":generateContent" in self.path:
+            self.send_json(200, candidate(fake_reply(body)))
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": "rota não encontrada", "status": "NOT_FOUND"}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=FAKE_CONFIG["host"], port=FAKE_CONFIG["port"]):
+    server = ThreadingHTTPServer((host, port), FakeGeminiHandler)
+    print(f"Gemini falso em http://{host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def pop_option(args, name, cast):
+    if name not in args:
+        return None
+    i = args.index(name)
+    value = cast(args[i + 1])
+    del args[i:i + 2]
+    return value
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    for option, key, cast in [("--fail-after", "fail_after", int), ("--latency", "latency", float),
+                              ("--rate-limit-every", "rate_limit_every", int),
+                              ("--error-rate", "error_rate", float), ("--retry-after", "retry_after", float)]:
+        value = pop_option(args, option, cast)
+        if value is not None:
+            FAKE_CONFIG[key] = value
+    serve(port=int(args[0]) if args else FAKE_CONFIG["port"])
@@ -0,0 +1,291 @@
+import os
+import re
+import sys
+import time
+import random
+import asyncio
+import threading
+import httpx
+from google.genai import errors
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.context import estimate_tokens
+
+
+# Agendador único para as chamadas ao Gemini. Um event loop asyncio numa thread
+# própria recebe os pedidos de qualquer thread do processo e aplica, nesta ordem:
+#   - limite de concorrência (pedidos em andamento ao mesmo tempo);
+#   - token bucket de requisições/min e de tokens/min (estimados pelo tamanho do prompt);
+#   - novas tentativas com backoff exponencial e jitter em erros transitórios
+#     (429, 5xx, timeouts e quedas de conexão);
+#   - prazo por chamada, contando fila, esperas e tentativas.
+# Só o que sobra depois disso (erro permanente, tentativas ou prazo esgotados) chega ao script.
+SCHEDULER_CONFIG = {
+    "max_concurrency": 8,          # chamadas em andamento ao mesmo tempo
+    "requests_per_minute": 60,     # 0 = sem limite
+    "tokens_per_minute": 250000,   # 0 = sem limite
+    "max_retries": 5,              # novas tentativas depois da primeira
+    "base_delay": 1.0,             # segundos antes da 1ª nova tentativa (dobra a cada uma)
+    "max_delay": 30.0,             # teto de cada espera
+    "deadline": 120.0,             # segundos por chamada, somando tudo (None = sem prazo)
+}
+
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    # Enche `per_minute` unidades por minuto até a capacidade de um minuto.
+    # Só é usado dentro do event loop do agendador, por isso dispensa lock.
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        if not self.rate:
+            return
+        amount = min(amount, self.capacity)  # um pedido maior que o minuto inteiro ainda passa
+        while True:
+            self.refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta):
+        # corrige a estimativa com o uso real informado pela API (pode ficar negativo)
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+OFFLINE_ERRORS = ("Name or service not known", "Temporary failure in name resolution",
+                  "nodename nor servname provided")
+
+
+def is_retryable(error):
+    if isinstance(error, errors.APIError):
+        return error.code in RETRY_STATUS
+    if any(message in str(error) for message in OFFLINE_ERRORS):
+        return False  # sem DNS não adianta insistir; os scripts tratam como modo offline
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def retry_after(error):
+    # espera sugerida pelo servidor: cabeçalho Retry-After ou RetryInfo.retryDelay no corpo
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        if header:
+            return float(header)
+    except ValueError:
+        pass
+    match = re.search(r"retryDelay'?\"?:\s*'?\"?(\d+(?:\.\d+)?)s", str(getattr(error, "details", "")))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt, config=SCHEDULER_CONFIG):
+    # "full jitter": sorteia entre 0 e o teto exponencial, espalhando os clientes
+    return random.uniform(0, min(config["max_delay"], config["base_delay"] * 2 ** attempt))
+
+
+def config_value(config, name):
+    if config is None:
+        return None
+    if isinstance(config, dict):
+        return config.get(name)
+    return getattr(config, name, None)
+
+
+def request_tokens(contents, config=None):
+    # estimativa grosseira: prompt + instrução de sistema + teto da resposta
+    prompt = contents if isinstance(contents, str) else str(contents)
+    instruction = config_value(config, "system_instruction") or ""
+    return (estimate_tokens(prompt) + estimate_tokens(str(instruction))
+            + (config_value(config, "max_output_tokens") or 0))
+
+
+def usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None)
+
+
+class Scheduler:
+
+    def __init__(self, config=SCHEDULER_CONFIG):
+        self.config = config
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "failed": 0, "deadline_exceeded": 0}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="genai-scheduler", daemon=True)
+        self.thread.start()
+        self.apply_config()
+
+    def apply_config(self):
+        self.semaphore = asyncio.Semaphore(self.config["max_concurrency"])
+        self.requests = TokenBucket(self.config["requests_per_minute"])
+        self.tokens = TokenBucket(self.config["tokens_per_minute"])
+
+    async def attempt(self, factory, tokens):
+        async with self.semaphore:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+            result = await factory()
+        used = usage_tokens(result)
+        if used is not None:
+            self.tokens.adjust(used - tokens)
+        return result
+
+    async def run(self, factory, tokens):
+        attempt = 0
+        while True:
+            try:
+                return await self.attempt(factory, tokens)
+            except Exception as e:
+                if getattr(e, "code", None) == 429:
+                    self.stats["rate_limited"] += 1
+                if not is_retryable(e) or attempt >= self.config["max_retries"]:
+                    raise
+                delay = backoff_delay(attempt, self.config)
+                hint = retry_after(e)
+                if hint is not None:
+                    delay = max(delay, min(hint, self.config["max_delay"]))
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def schedule(self, factory, tokens=0, deadline=None):
+        # factory: função sem argumentos que devolve uma corrotina nova a cada tentativa
+        deadline = self.config["deadline"] if deadline is None else deadline
+        self.stats["calls"] += 1
+        try:
+            return await asyncio.wait_for(self.run(factory, tokens), deadline)
+        except asyncio.TimeoutError as e:
+            self.stats["deadline_exceeded"] += 1
+            raise TimeoutError(f"prazo de {deadline}s esgotado para a chamada ao modelo") from e
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+
+    def submit(self, factory, tokens=0, deadline=None):
+        # não bloqueia: devolve um concurrent.futures.Future
+        return asyncio.run_coroutine_threadsafe(self.schedule(factory, tokens, deadline), self.loop)
+
+    def call(self, factory, tokens=0, deadline=None):
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("call() bloquearia o event loop; use await schedule()")
+        return self.submit(factory, tokens, deadline).result()
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = Scheduler()
+    return _scheduler
+
+
+def configure(**kwargs):
+    # ajusta SCHEDULER_CONFIG (ex.: requests_per_minute de um script) antes ou durante o uso
+    unknown = set(kwargs) - set(SCHEDULER_CONFIG)
+    if unknown:
+        raise ValueError(f"opções desconhecidas do agendador: {sorted(unknown)}")
+    SCHEDULER_CONFIG.update(kwargs)
+    if _scheduler is not None:
+        _scheduler.loop.call_soon_threadsafe(_scheduler.apply_config)
+
+
+def scheduler_stats():
+    return dict(get_scheduler().stats)
+
+
+def generate_content(client, model, contents, config=None, deadline=None):
+    # substitui client.models.generate_content: mesma resposta, mas passando pelo agendador
+    return get_scheduler().call(
+        lambda: client.aio.models.generate_content(model=model, contents=contents, config=config),
+        request_tokens(contents, config), deadline)
+
+
+def submit_text(client, model, contents, config=None, deadline=None):
+    # versão não bloqueante para lotes: Future com o texto da resposta
+    async def request():
+        response = await client.aio.models.generate_content(model=model, contents=contents, config=config)
+        return response.text.strip()
+    return get_scheduler().submit(request, request_tokens(contents, config), deadline)
+
+
+def stream_content(client, model, contents, config=None, deadline=None):
+    # Stream síncrono: passa pelos limites como as outras chamadas, e só tenta de novo
+    # se o erro vier antes do primeiro pedaço (depois disso a resposta já foi mostrada).
+    scheduler = get_scheduler()
+    settings = scheduler.config
+    tokens = request_tokens(contents, config)
+    deadline = settings["deadline"] if deadline is None else deadline
+    start = time.monotonic()
+    attempt = 0
+    scheduler.stats["calls"] += 1
+    while True:
+        remaining = None if deadline is None else max(0.0, deadline - (time.monotonic() - start))
+        slot = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(acquire_slot(scheduler, tokens), remaining), scheduler.loop).result()
+        started = False
+        try:
+            for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+                started = True
+                yield chunk
+            return
+        except Exception as e:
+            if getattr(e, "code", None) == 429:
+                scheduler.stats["rate_limited"] += 1
+            delay = max(backoff_delay(attempt, settings), min(retry_after(e) or 0, settings["max_delay"]))
+            out_of_time = deadline is not None and time.monotonic() - start + delay > deadline
+            if started or not is_retryable(e) or attempt >= settings["max_retries"] or out_of_time:
+                scheduler.stats["failed"] += 1
+                raise
+            scheduler.stats["retries"] += 1
+            attempt += 1
+            time.sleep(delay)
+        finally:
+            scheduler.loop.call_soon_threadsafe(slot.release)
+
+
+async def acquire_slot(scheduler, tokens):
+    # ocupa uma vaga de concorrência e consome os limites; devolve o semáforo
+    # para stream_content liberar a vaga mesmo que configure() troque os limites
+    semaphore = scheduler.semaphore
+    await semaphore.acquire()
+    try:
+        await scheduler.requests.acquire(1)
+        await scheduler.tokens.acquire(tokens)
+    except BaseException:
+        semaphore.release()
+        raise
+    return semaphore
+
+
+if __name__ == "__main__":
+    # Teste de carga contra um servidor local (ex.: shared/fake_gemini.py com --rate-limit-every):
+    #     GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=x python3 shared/scheduler.py 50
+    from shared.client import get_client
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    configure(requests_per_minute=0, base_delay=0.2)
+    client = get_client()
+    start = time.perf_counter()
+    futures = [submit_text(client, "gemini-1.5-flash", f"pergunta {i}") for i in range(total)]
+    failures = 0
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            failures += 1
+            print(f"falhou: {e}")
+    elapsed = time.perf_counter() - start
+    print(f"{total - failures}/{total} respostas em {elapsed:.2f}s; {scheduler_stats()}")
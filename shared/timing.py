@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+
+# Instrumentação leve de latência: spans (context manager ou decorador) alimentam um
+# histograma por etapa e, opcionalmente, um trace JSON no formato do chrome://tracing
+# (também aberto pelo Perfetto). Desligada, cada span custa só um teste de flag.
+TIMING_CONFIG = {
+    "enabled": False,
+    "max_events": 100000,   # eventos guardados para o trace (o histograma não tem limite)
+}
+
+# limites dos baldes em milissegundos: 0.01 ms a ~170 s, dobrando a cada balde
+BUCKETS_MS = [0.01 * 2 ** i for i in range(25)]
+
+
+class Histogram:
+    # memória fixa: só contagens por balde, mais soma, mínimo e máximo exatos
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        # limite superior do balde onde cai o percentil (aproximação de no máximo 2x)
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "min_ms": round(self.min, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+_histograms = {}
+_events = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_no_span = _NoSpan()
+
+
+def enable(enabled=True):
+    TIMING_CONFIG["enabled"] = enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _events.clear()
+
+
+def record(name, start, end, attrs=None):
+    ms = (end - start) * 1000
+    with _lock:
+        _histograms.setdefault(name, Histogram()).add(ms)
+        if len(_events) < TIMING_CONFIG["max_events"]:
+            event = {"name": name, "ph": "X", "ts": round((start - _origin) * 1e6, 1),
+                     "dur": round(ms * 1000, 1), "pid": os.getpid(), "tid": threading.get_ident()}
+            if attrs:
+                event["args"] = attrs
+            _events.append(event)
+
+
+@contextmanager
+def _span(name, attrs):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter(), attrs)
+
+
+def span(name, **attrs):
+    # uso: with span("index.top_k", k=3): ...
+    if not TIMING_CONFIG["enabled"]:
+        return _no_span
+    return _span(name, attrs)
+
+
+def timed(name=None):
+    # decorador: mede a função inteira como um span
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TIMING_CONFIG["enabled"]:
+                return fn(*args, **kwargs)
+            with _span(label, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def stage_stats():
+    with _lock:
+        return {name: h.summary() for name, h in _histograms.items()}
+
+
+def report(file=sys.stderr):
+    stats = stage_stats()
+    if not stats:
+        return
+    print(f"{'etapa':<32} {'n':>6} {'total ms':>10} {'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}", file=file)
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"{name:<32} {s['count']:>6} {s['total_ms']:>10.2f} {s['p50_ms']:>9.3f} "
+              f"{s['p95_ms']:>9.3f} {s['p99_ms']:>9.3f} {s['max_ms']:>9.3f}", file=file)
+
+
+def write_trace(path):
+    # trace JSON (formato Trace Event): abrir em chrome://tracing ou ui.perfetto.dev
+    with _lock:
+        data = {"traceEvents": list(_events), "displayTimeUnit": "ms",
+                "otherData": {"stages": {n: h.summary() for n, h in _histograms.items()}}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)